@@ -3,18 +3,24 @@ Dasbor admin untuk aplikasi Caffe Dehh
 Berisi manajemen menu (termasuk stok), promo, pesanan, ulasan, dan analitik.
 """
 
+import functools
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import (
-    get_all_menu, create_menu_item, update_menu_item, delete_menu_item,
+    get_all_menu, delete_menu_item, image_status, IMAGE_UPLOADING, IMAGE_FAILED,
     list_promos, create_promo, update_promo, delete_promo,
-    list_orders, update_order_status,
+    list_orders_page, update_order_status, ORDER_STATUSES, OPEN_ORDER_STATUSES,
     get_all_reviews,
     read_users, create_user, update_user_role, delete_user,
-    update_menu_availability, get_sales_data, get_top_selling_items
+    update_menu_availability, get_sales_rollup, get_top_selling_items,
+    get_pool_stats
 )
-from storage import upload_image_to_storage
+from images import is_valid_image
+from upload_service import create_menu_with_image, update_menu_with_image
+from ui import menu_image_url
+from session_tokens import end_session, revoke_user
+from config import ORDER_PAGE_SIZE
 
 # --- FUNGSI UTAMA DASBOR ---
 
@@ -28,32 +34,94 @@ def show_admin_dashboard():
         st.subheader(f"Selamat datang, Admin {user.get('nama_pengguna', 'Unknown')}!")
     with col2:
         if st.button("Keluar", key='admin_logout', use_container_width=True):
-            st.session_state.clear()
-            st.session_state['page'] = 'login'
+            end_session()
             st.rerun()
 
-    tabs = st.tabs(["📊 Analitik", "🍔 Kelola Menu", "🎉 Kelola Promo", "📦 Pesanan", "⭐ Ulasan", "👤 Manajemen Pengguna"])
-    
-    with tabs[0]:
-        show_analytics_tab()
-    with tabs[1]:
-        manage_menu()
-    with tabs[2]:
-        manage_promo()
-    with tabs[3]:
-        admin_orders()
-    with tabs[4]:
-        admin_reviews()
-    with tabs[5]:
-        manage_users()
+    # Hanya tab aktif yang dijalankan; setiap tab adalah fragmen sehingga aksi di dalamnya
+    # (mis. "Perbarui Status") hanya menjalankan ulang tab tersebut
+    active_tab = st.radio("Navigasi", list(ADMIN_TABS), key='admin_tab', horizontal=True, label_visibility="collapsed")
+    ADMIN_TABS[active_tab]()
+
+# --- DATA TAB ---
+# Data setiap tab dimuat saat tab dibuka dan disimpan di sesi ('admin_tab_data') sampai admin menekan
+# "Muat Ulang" atau mengubah data dari tab itu sendiri.
+
+def _tab_cache(tab: str) -> dict:
+    return st.session_state.setdefault('admin_tab_data', {}).setdefault(tab, {'data': {}, 'dibaca': set()})
+
+def tab_data(tab: str, loader, *args):
+    """Hasil loader(*args) untuk tab, dari cache sesi jika sudah pernah dimuat dengan argumen yang sama."""
+    cache = _tab_cache(tab)
+    key = (loader.__name__, args)
+    if key not in cache['data']:
+        cache['data'][key] = (datetime.now(), loader(*args))
+    cache['dibaca'].add(key)
+    return cache['data'][key][1]
+
+def refresh_tab_data(tab: str):
+    """Membuang data tab sehingga dimuat ulang dari database pada run berikutnya."""
+    st.session_state.get('admin_tab_data', {}).pop(tab, None)
+
+def run_tab_action(tab: str, action, *args, message: str = None):
+    """Callback tombol aksi: mengubah data lalu membuang data tab, sehingga fragmen yang dirender ulang
+    setelah callback langsung memuat data baru tanpa st.rerun()."""
+    action(*args)
+    refresh_tab_data(tab)
+    if message:
+        st.toast(message)
+
+def admin_tab(tab: str):
+    """Dekorator tab admin: fragmen dengan tombol Muat Ulang dan waktu data tab dimuat."""
+    def decorator(render):
+        @st.fragment
+        @functools.wraps(render)
+        def fragment():
+            col_time, col_refresh = st.columns([4, 1])
+            with col_refresh:
+                st.button("🔄 Muat Ulang", key=f"refresh_{tab}", use_container_width=True,
+                          on_click=refresh_tab_data, args=(tab,))
+            _tab_cache(tab)['dibaca'] = set()
+            render()
+            # Buang data yang tidak dipakai run ini (mis. halaman atau filter lama) agar sesi tidak membengkak
+            cache = _tab_cache(tab)
+            cache['data'] = {key: value for key, value in cache['data'].items() if key in cache['dibaca']}
+            if cache['data']:
+                oldest = min(loaded_at for loaded_at, _ in cache['data'].values())
+                col_time.caption(f"🕒 Data dimuat pukul {oldest.strftime('%H:%M:%S')}")
+        return fragment
+    return decorator
 
 # --- TAB ANALITIK ---
 
+# Label granularitas grafik pendapatan -> nilai untuk get_sales_rollup
+GRANULARITY_OPTIONS = {"Per Jam": "hour", "Harian": "day", "Mingguan": "week", "Bulanan": "month"}
+
+@admin_tab('analitik')
 def show_analytics_tab():
     st.markdown("### Analitik Kinerja Kafe")
-    
-    sales_data = get_sales_data()
-    df_sales = pd.DataFrame(sales_data, columns=['tanggal', 'total_pendapatan'])
+
+    # Rentang tanggal dan granularitas grafik
+    today = datetime.now().date()
+    col_range, col_gran = st.columns([3, 1])
+    with col_range:
+        date_range = st.date_input(
+            "Rentang Tanggal",
+            value=(today - timedelta(days=29), today),
+            max_value=today,
+            key='analytics_range'
+        )
+    with col_gran:
+        granularity_label = st.selectbox("Granularitas", list(GRANULARITY_OPTIONS), index=1, key='analytics_granularity')
+
+    # date_input mengembalikan satu tanggal selama pengguna baru memilih tanggal awal
+    if isinstance(date_range, (tuple, list)):
+        start_date = date_range[0]
+        end_date = date_range[1] if len(date_range) > 1 else date_range[0]
+    else:
+        start_date = end_date = date_range
+
+    sales_data = tab_data('analitik', get_sales_rollup, start_date, end_date, GRANULARITY_OPTIONS[granularity_label])
+    df_sales = pd.DataFrame(sales_data, columns=['periode', 'total_pendapatan', 'jumlah_pesanan'])
     
     # Menampilkan metrik utama
     col1, col2, col3 = st.columns(3)
@@ -61,25 +129,25 @@ def show_analytics_tab():
     total_sales = df_sales['total_pendapatan'].sum() if not df_sales.empty else 0
     col1.metric("💰 Total Pendapatan", f"Rp {int(total_sales):,}")
     
-    orders = list_orders()
-    completed_orders = len([o for o in orders if o['status'] == 'Selesai'])
+    completed_orders = int(df_sales['jumlah_pesanan'].sum()) if not df_sales.empty else 0
     col2.metric("📦 Pesanan Selesai", completed_orders)
 
-    menu_count = len(get_all_menu())
+    menu_count = len(tab_data('analitik', get_all_menu))
     col3.metric("🍔 Jumlah Menu", menu_count)
     
     st.markdown("---")
 
-    st.markdown("#### Tren Pendapatan Harian")
+    st.markdown(f"#### Tren Pendapatan ({granularity_label})")
     if not df_sales.empty:
-        df_sales['tanggal'] = pd.to_datetime(df_sales['tanggal'])
-        df_sales = df_sales.set_index('tanggal')
-        st.line_chart(df_sales)
+        df_sales['periode'] = pd.to_datetime(df_sales['periode'])
+        df_sales['total_pendapatan'] = df_sales['total_pendapatan'].astype(float)
+        df_sales = df_sales.set_index('periode')
+        st.line_chart(df_sales[['total_pendapatan']])
     else:
         st.info("Belum ada data penjualan yang selesai untuk ditampilkan.")
 
     st.markdown("#### Item Menu Terlaris (Berdasarkan Kuantitas)")
-    top_items = get_top_selling_items()
+    top_items = tab_data('analitik', get_top_selling_items)
     if top_items:
         df_top_items = pd.DataFrame(top_items, columns=['nama_menu', 'jumlah_terjual'])
         df_top_items = df_top_items.set_index('nama_menu')
@@ -87,8 +155,22 @@ def show_analytics_tab():
     else:
         st.info("Belum ada data item terlaris.")
 
+    # Statistik pool koneksi untuk menentukan ukuran pool saat jam sibuk
+    with st.expander("🔌 Statistik Koneksi Database"):
+        pool = get_pool_stats()
+        col_a, col_b, col_c, col_d = st.columns(4)
+        col_a.metric("Dipakai", f"{pool['dipakai']} / {pool['ukuran_maks']}")
+        col_b.metric("Menganggur", pool['menganggur'])
+        col_c.metric("Rata-rata Tunggu", f"{pool['rata_rata_tunggu_ms']:.1f} ms")
+        col_d.metric("Handshake Dihindari", pool['handshake_dihindari'])
+        st.caption(
+            f"Checkout: {pool['checkout']} | Handshake: {pool['handshake']} | "
+            f"Tunggu maks: {pool['tunggu_maks_ms']:.1f} ms | Timeout: {pool['timeout']} | Dibuang: {pool['dibuang']}"
+        )
+
 # --- TAB MANAJEMEN MENU ---
 
+@admin_tab('menu')
 def manage_menu():
     st.markdown("### ☕ Manajemen Menu")
     
@@ -100,7 +182,7 @@ def manage_menu():
 
     st.markdown("---")
     st.markdown("#### Daftar Menu")
-    items = get_all_menu()
+    items = tab_data('menu', get_all_menu)
     
     # Menggunakan tata letak kolom yang responsif untuk setiap item
     for it in items:
@@ -116,7 +198,7 @@ def manage_menu():
             with col_img:
                 # Tampilkan gambar atau placeholder
                 if it['url_gambar']:
-                    st.image(it['url_gambar'], width=100)
+                    st.image(menu_image_url(it, 'thumb', 'webp'), width=100)
                 else:
                     st.markdown("<div style='height: 100px; width: 100px; background-color: #ccc; border-radius: 8px; display: flex; align-items: center; justify-content: center; color: #666; font-size: 0.8em; text-align: center;'>Gambar Tidak Ada</div>", unsafe_allow_html=True)
             
@@ -124,6 +206,10 @@ def manage_menu():
                 st.markdown(f"**{it['nama']}**")
                 st.markdown(f"*{it['kategori']}* | **Rp {int(it['harga']):,}**")
                 st.caption(f"Status: <span style='color: {status_color}; font-weight: bold;'>{status_text}</span>", unsafe_allow_html=True)
+                if image_status(it) == IMAGE_UPLOADING:
+                    st.caption("⏳ Gambar sedang diunggah...")
+                elif image_status(it) == IMAGE_FAILED:
+                    st.caption("⚠️ Unggahan gambar gagal. Unggah ulang melalui Edit.")
                 if it['deskripsi']:
                     st.caption(it['deskripsi'])
             
@@ -132,26 +218,23 @@ def manage_menu():
                 new_status = not it.get('tersedia', True)
                 status_btn_text = "Set Habis" if not new_status else "Set Tersedia"
                 
-                if st.button(status_btn_text, key=f"stock_{it['id']}", use_container_width=True):
-                    update_menu_availability(it['id'], new_status)
-                    st.rerun()
+                st.button(status_btn_text, key=f"stock_{it['id']}", use_container_width=True,
+                          on_click=run_tab_action, args=('menu', update_menu_availability, it['id'], new_status))
 
                 if st.button("✏️ Edit", key=f"edit_{it['id']}", use_container_width=True):
                     st.session_state['edit_item'] = it
                     st.session_state['page'] = 'admin_edit_menu'
                     st.rerun()
 
-                if st.button("🗑️ Hapus", key=f"delete_{it['id']}", use_container_width=True):
-                    # Konfirmasi penghapusan (menggunakan tampilan modal sederhana/peringatan)
-                    if st.warning(f"Yakin ingin menghapus {it['nama']}?"):
-                         delete_menu_item(it['id'])
-                         st.success("Menu dihapus")
-                         st.rerun()
+                st.button("🗑️ Hapus", key=f"delete_{it['id']}", use_container_width=True,
+                          on_click=run_tab_action, args=('menu', delete_menu_item, it['id']),
+                          kwargs={'message': f"Menu {it['nama']} dihapus"})
 
         st.markdown("---") # Garis pemisah antar kartu
 
 # --- TAB MANAJEMEN PROMO ---
 
+@admin_tab('promo')
 def manage_promo():
     st.markdown("### 🎉 Manajemen Promo")
     
@@ -161,7 +244,7 @@ def manage_promo():
 
     st.markdown("---")
     st.markdown("#### Daftar Kode Promo")
-    promos = list_promos()
+    promos = tab_data('promo', list_promos)
     
     # Tabel yang lebih rapi
     promo_data = [
@@ -195,29 +278,51 @@ def manage_promo():
             # Toggle Status
             with col_toggle:
                 new_status = not selected_promo['aktif']
-                if st.button(f"{'Deaktifkan' if selected_promo['aktif'] else 'Aktifkan'} {selected_promo['kode']}", key=f"toggle_promo_{selected_promo['id']}", use_container_width=True):
-                    update_promo(selected_promo['id'], selected_promo['kode'], selected_promo['jumlah_diskon'], new_status)
-                    st.success("Status promo diperbarui.")
-                    st.rerun()
+                st.button(f"{'Deaktifkan' if selected_promo['aktif'] else 'Aktifkan'} {selected_promo['kode']}", key=f"toggle_promo_{selected_promo['id']}", use_container_width=True,
+                          on_click=run_tab_action,
+                          args=('promo', update_promo, selected_promo['id'], selected_promo['kode'], selected_promo['jumlah_diskon'], new_status),
+                          kwargs={'message': "Status promo diperbarui."})
             
             # Delete Promo
             with col_delete:
-                if st.button("🗑️ Hapus Promo", key=f"delete_promo_{selected_promo['id']}", use_container_width=True):
-                    delete_promo(selected_promo['id'])
-                    st.success(f"Promo {selected_promo['kode']} dihapus.")
-                    st.rerun()
+                st.button("🗑️ Hapus Promo", key=f"delete_promo_{selected_promo['id']}", use_container_width=True,
+                          on_click=run_tab_action, args=('promo', delete_promo, selected_promo['id']),
+                          kwargs={'message': f"Promo {selected_promo['kode']} dihapus."})
     
 
 # --- TAB PESANAN ---
 
+@admin_tab('pesanan')
 def admin_orders():
     st.markdown("### 📦 Daftar Pesanan Masuk")
-    orders = list_orders()
+
+    # Filter antrean: default hanya pesanan yang masih terbuka
+    col_status_filter, col_date_filter, col_page_size = st.columns([3, 2, 1])
+    with col_status_filter:
+        status_filter = st.multiselect("Status", list(ORDER_STATUSES), default=list(OPEN_ORDER_STATUSES), key='order_status_filter')
+    with col_date_filter:
+        date_filter = st.date_input("Tanggal Dibuat", value=(), key='order_date_filter')
+    with col_page_size:
+        page_sizes = sorted({10, 20, 50, ORDER_PAGE_SIZE})
+        page_size = st.selectbox("Per Halaman", page_sizes, index=page_sizes.index(ORDER_PAGE_SIZE), key='order_page_size')
+
+    start_date = date_filter[0] if len(date_filter) > 0 else None
+    end_date = date_filter[1] if len(date_filter) > 1 else start_date
+
+    # Tumpukan cursor keyset untuk halaman yang sudah dikunjungi; diatur ulang saat filter berubah
+    filter_key = (tuple(status_filter), start_date, end_date, page_size)
+    if st.session_state.get('order_filter_key') != filter_key:
+        st.session_state['order_filter_key'] = filter_key
+        st.session_state['order_cursors'] = [None]
+    cursors = st.session_state['order_cursors']
+
+    orders, next_cursor = tab_data(
+        'pesanan', list_orders_page, tuple(status_filter) or None, start_date, end_date, cursors[-1], page_size,
+    )
     
     if not orders:
-        st.info("Belum ada pesanan baru.")
-        return
-
+        st.info("Tidak ada pesanan yang cocok dengan filter.")
+    
     for o in orders:
         # Menggunakan kontainer dengan warna status yang lebih baik
         status = o['status']
@@ -252,30 +357,45 @@ def admin_orders():
             st.markdown("---")
             
             # Aksi Status
-            status_options = ["Tertunda", "Sedang Diproses", "Selesai", "Dibatalkan"]
+            status_options = list(ORDER_STATUSES)
             current_index = status_options.index(o['status']) if o['status'] in status_options else 0
             
             col_status, col_update = st.columns([3, 1])
             with col_status:
-                new_status = st.selectbox("Ubah Status", status_options, index=current_index, key=f"status_{o['id']}")
+                st.selectbox("Ubah Status", status_options, index=current_index, key=f"status_{o['id']}")
             
             with col_update:
                 st.markdown("<div style='margin-top: 25px;'>", unsafe_allow_html=True)
-                if st.button("Perbarui Status", key=f"update_status_{o['id']}", use_container_width=True):
-                    update_order_status(o['id'], new_status)
-                    st.success("Status berhasil diperbarui")
-                    st.rerun()
+                st.button("Perbarui Status", key=f"update_status_{o['id']}", use_container_width=True,
+                          on_click=_update_order_status, args=(o['id'],))
                 st.markdown("</div>", unsafe_allow_html=True)
                 
             st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("") # Spasi antar pesanan
 
+    # Navigasi halaman
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("← Sebelumnya", key='orders_prev', disabled=len(cursors) == 1, use_container_width=True,
+                  on_click=cursors.pop)
+    with col_page:
+        st.markdown(f"<p style='text-align: center; margin-top: 10px;'>Halaman {len(cursors)}</p>", unsafe_allow_html=True)
+    with col_next:
+        st.button("Berikutnya →", key='orders_next', disabled=next_cursor is None, use_container_width=True,
+                  on_click=cursors.append, args=(next_cursor,))
+
+def _update_order_status(order_id: int):
+    """Callback "Perbarui Status": status baru dibaca dari selectbox pesanan tersebut."""
+    run_tab_action('pesanan', update_order_status, order_id, st.session_state[f"status_{order_id}"],
+                   message="Status berhasil diperbarui")
+
 
 # --- TAB ULASAN ---
 
+@admin_tab('ulasan')
 def admin_reviews():
     st.markdown("### ⭐ Ulasan Pelanggan")
-    reviews = get_all_reviews()
+    reviews = tab_data('ulasan', get_all_reviews)
 
     if not reviews:
         st.info("Belum ada ulasan yang masuk.")
@@ -304,9 +424,10 @@ def admin_reviews():
 
 # --- TAB MANAJEMEN PENGGUNA ---
 
+@admin_tab('pengguna')
 def manage_users():
     st.markdown("### 👥 Manajemen Pengguna")
-    users_data = read_users()
+    users_data = tab_data('pengguna', read_users)
     
     # Mengubah tampilan DataFrame menjadi tabel yang lebih bagus
     df_users = pd.DataFrame(users_data, columns=["ID", "Nama Pengguna", "Peran"])
@@ -328,17 +449,11 @@ def manage_users():
         role_index = roles.index(current_role) if current_role in roles else 0
         
         with col_role:
-            new_role = st.selectbox("Pilih Peran Baru", roles, index=role_index, key='new_role_select')
+            st.selectbox("Pilih Peran Baru", roles, index=role_index, key='new_role_select')
         
         with col_action:
             st.markdown("<div style='margin-top: 25px;'>", unsafe_allow_html=True)
-            if st.button("Perbarui Peran", key='update_role_btn', use_container_width=True):
-                if selected_user and new_role:
-                    update_user_role(selected_user, new_role)
-                    st.success(f"Peran pengguna {selected_user} berhasil diubah menjadi {new_role}.")
-                    st.rerun()
-                else:
-                    st.error("Pilih pengguna dan peran.")
+            st.button("Perbarui Peran", key='update_role_btn', use_container_width=True, on_click=_update_user_role)
             st.markdown("</div>", unsafe_allow_html=True)
         
         st.markdown("---")
@@ -351,12 +466,37 @@ def manage_users():
                     st.error(f"⚠️ **PERINGATAN!** Anda akan menghapus pengguna **{selected_user}**. Konfirmasi:")
                     if st.button("Ya, Hapus Sekarang", key='confirm_delete_user'):
                         delete_user(selected_user)
+                        revoke_user(selected_user)
                         st.success(f"Pengguna {selected_user} berhasil dihapus.")
+                        refresh_tab_data('pengguna')
                         st.rerun()
                 else:
                     st.warning("Pilih pengguna untuk dihapus.")
 
 
+def _update_user_role():
+    """Callback "Perbarui Peran": pengguna dan peran dibaca dari kedua selectbox."""
+    selected_user = st.session_state.get('user_role_select')
+    new_role = st.session_state.get('new_role_select')
+    if not (selected_user and new_role):
+        st.toast("Pilih pengguna dan peran.")
+        return
+    run_tab_action('pengguna', update_user_role, selected_user, new_role,
+                   message=f"Peran pengguna {selected_user} berhasil diubah menjadi {new_role}.")
+    # Token lama masih membawa peran lama; pengguna harus login ulang
+    revoke_user(selected_user)
+
+
+ADMIN_TABS = {
+    "📊 Analitik": show_analytics_tab,
+    "🍔 Kelola Menu": manage_menu,
+    "🎉 Kelola Promo": manage_promo,
+    "📦 Pesanan": admin_orders,
+    "⭐ Ulasan": admin_reviews,
+    "👤 Manajemen Pengguna": manage_users,
+}
+
+
 # --- HALAMAN-HALAMAN TUGAS BARU (Formulir yang lebih bersih) ---
 
 def page_admin_add_menu():
@@ -377,18 +517,18 @@ def page_admin_add_menu():
                     st.error("Nama Menu dan Harga wajib diisi.")
                     return
 
-                image_url = None
-                if img is not None:
-                    bytes_data = img.getvalue()
-                    filename = f"menu_{int(datetime.now().timestamp())}_{img.name}"
-                    try:
-                        image_url = upload_image_to_storage(bytes_data, filename)
-                        st.toast("Gambar berhasil diunggah!")
-                    except Exception as e:
-                        st.error(f"Gagal mengunggah gambar: {e}")
-                
-                create_menu_item(name, category, desc, price, image_url)
+                file_bytes = img.getvalue() if img is not None else None
+                if file_bytes is not None and not is_valid_image(file_bytes):
+                    st.error("Berkas gambar tidak valid.")
+                    return
+
+                # Menu langsung dibuat; gambar diunggah di latar dan muncul setelah selesai
+                create_menu_with_image(name, category, desc, price, file_bytes, img.name if img else None)
+                if file_bytes is not None:
+                    st.toast("Gambar sedang diunggah di latar.")
                 st.success("Menu berhasil dibuat!")
+                refresh_tab_data('menu')
+                refresh_tab_data('analitik')
                 st.session_state['page'] = 'admin_dashboard'
                 st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
@@ -415,6 +555,7 @@ def page_admin_add_promo():
                 try:
                     create_promo(code, amt, active)
                     st.success("Promo berhasil dibuat!")
+                    refresh_tab_data('promo')
                     st.session_state['page'] = 'admin_dashboard'
                     st.rerun()
                 except Exception as e:
@@ -458,23 +599,23 @@ def page_admin_edit_menu():
                 # Tampilkan gambar saat ini
                 if it.get('url_gambar'):
                     st.caption("Gambar Saat Ini:")
-                    st.image(it['url_gambar'], width=100)
+                    st.image(menu_image_url(it, 'thumb', 'webp'), width=100)
                 img = st.file_uploader("Ganti Gambar (opsional)", type=['png','jpg','jpeg'])
             
             submitted = st.form_submit_button("Simpan Perubahan")
 
             if submitted:
-                image_url = it.get('url_gambar')
-                if img:
-                    try:
-                        filename = f"menu_{int(datetime.now().timestamp())}_{img.name}"
-                        image_url = upload_image_to_storage(img.getvalue(), filename)
-                        st.toast("Gambar baru berhasil diunggah!")
-                    except Exception as e:
-                        st.error(f"Gagal mengunggah gambar: {e}")
-                
-                update_menu_item(it['id'], name, category, desc, price, image_url)
+                file_bytes = img.getvalue() if img else None
+                if file_bytes is not None and not is_valid_image(file_bytes):
+                    st.error("Berkas gambar tidak valid.")
+                    return
+
+                # Gambar lama tetap tampil sampai gambar baru selesai diunggah di latar
+                update_menu_with_image(it['id'], name, category, desc, price, file_bytes, img.name if img else None)
+                if file_bytes is not None:
+                    st.toast("Gambar baru sedang diunggah di latar.")
                 st.success("Menu berhasil diperbarui")
+                refresh_tab_data('menu')
                 del st.session_state['edit_item']
                 st.session_state['page'] = 'admin_dashboard'
                 st.rerun()
@@ -0,0 +1,51 @@
+"""
+Aset statis untuk aplikasi Caffe Dehh
+Stylesheet, font dan logo berada di folder static/ dan dilayani Streamlit di app/static/
+(server.enableStaticServing di .streamlit/config.toml).
+"""
+
+import hashlib
+import os
+
+import streamlit as st
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+STYLESHEET = "app.css"
+
+# Sumber aset pihak ketiga yang diunduh sekali oleh `python maintenance.py fetch-assets`
+FONT_CSS_URL = "https://fonts.googleapis.com/css2?family=Playfair+Display:wght@400;700&family=Nunito:wght@400;600;700&display=swap"
+FONT_FILES = {
+    "Playfair Display": "fonts/playfair-display.woff2",
+    "Nunito": "fonts/nunito.woff2",
+}
+LOGO_URL = "https://i.imgur.com/TA35aIw.png"
+LOGO_FILE = "logo.png"
+
+
+@st.cache_resource(show_spinner=False)
+def asset_url(name: str) -> str:
+    """URL aset dengan sidik isi (?v=<hash>); berubah hanya jika isi berkas berubah, sehingga browser
+    dan proxy boleh menyimpannya lama. Dihitung sekali per proses."""
+    with open(os.path.join(STATIC_DIR, name), "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"{STATIC_URL}/{name}?v={digest}"
+
+
+@st.cache_resource(show_spinner=False)
+def _remote_fallback_css() -> str:
+    """Aturan cadangan ke sumber pihak ketiga untuk font/logo yang belum diunduh ke static/
+    (`python maintenance.py fetch-assets`). Kosong setelah semua berkas tersedia."""
+    rules = []
+    if not all(os.path.exists(os.path.join(STATIC_DIR, name)) for name in FONT_FILES.values()):
+        # Diimpor setelah app.css sehingga @font-face Google menimpa aturan lokal yang berkasnya tidak ada
+        rules.append(f"@import url('{FONT_CSS_URL}');")
+    if not os.path.exists(os.path.join(STATIC_DIR, LOGO_FILE)):
+        rules.append(f"[data-testid=\"stAppViewContainer\"] {{ background-image: url('{LOGO_URL}'); }}")
+    return "".join(rules)
+
+
+def stylesheet_html() -> str:
+    """Referensi kecil ke stylesheet untuk disuntikkan setiap rerun, menggantikan seluruh isi CSS."""
+    return f"<style>@import url('{asset_url(STYLESHEET)}');{_remote_fallback_css()}</style>"
@@ -5,6 +5,7 @@ Berisi fungsionalitas masuk, pendaftaran, dan lupa kata sandi
 
 import streamlit as st
 from database import authenticate, create_user, user_exists, update_user_password
+from session_tokens import start_session, revoke_user
 
 def page_login():
     """Menampilkan halaman login."""
@@ -28,15 +29,9 @@ def page_login():
                     else:
                         user = authenticate(username, password)
                         if user:
-                            st.session_state['user'] = user
-                            st.session_state['logged_in'] = True
-                            st.session_state['nama_pengguna'] = username
-                            st.session_state['peran'] = user['peran']
+                            # Token sesi di cookie membuat login bertahan saat browser dimuat ulang
+                            start_session(user)
                             st.success(f"Selamat datang kembali, {username}!")
-                            if user['peran'] == 'admin':
-                                st.session_state['page'] = 'admin_dashboard'
-                            else:
-                                st.session_state['page'] = 'user_dashboard'
                             st.rerun()
                         else:
                             st.error("Nama pengguna atau kata sandi salah.")
@@ -134,6 +129,8 @@ def page_forgot_password():
                         else:
                             try:
                                 update_user_password(username, new_password)
+                                # Sesi yang masuk dengan sandi lama tidak dapat dipulihkan lagi
+                                revoke_user(username)
                                 st.success("Kata sandi berhasil diubah! Silakan masuk dengan sandi baru Anda.")
                                 del st.session_state.reset_step
                                 del st.session_state.username_to_reset
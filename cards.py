@@ -0,0 +1,90 @@
+"""
+Renderer kartu menu untuk aplikasi Caffe Dehh
+Setiap kartu adalah satu blok HTML ringkas dengan kelas CSS bersama (lihat bagian "Kartu Menu" di
+static/app.css), disimpan per item dan per generasi katalog agar tidak dibangun ulang setiap rerun.
+"""
+
+from html import escape
+
+from database import menu_catalog
+from ui import menu_picture_html
+
+# Lebar tampilan gambar kartu untuk atribut sizes: satu kolom di ponsel, tiga kolom di layar lebar
+CARD_IMAGE_SIZES = "(max-width: 640px) 100vw, 33vw"
+
+IMAGE_STYLE = "width: 100%; height: 100%; object-fit: cover;"
+
+
+def _memo() -> dict:
+    # Dict kosong baru setiap kali katalog dimuat ulang, sehingga kartu lama ikut terbuang
+    return menu_catalog.derive("kartu_menu", lambda _: {})
+
+
+def _description(text: str, limit: int) -> str:
+    if not text:
+        return "<div class='cd-desc'><strong>Deskripsi:</strong> -</div>"
+    if len(text) <= limit:
+        return f"<div class='cd-desc'><strong>Deskripsi:</strong> {escape(text)}</div>"
+    # Buka/tutup ditangani browser dengan <details>, tanpa tombol dan rerun
+    return (
+        f"<details class='cd-desc'><summary><strong>Deskripsi:</strong> "
+        f"<span class='cd-short'>{escape(text[:limit])}...</span></summary>{escape(text)}</details>"
+    )
+
+
+def _rating(item: dict) -> str:
+    return f"⭐ {item['rating_rata_rata']:.1f} ({item['jumlah_ulasan']} ulasan)"
+
+
+def _menu_card(item: dict) -> str:
+    if item['url_gambar']:
+        image = f"<div class='cd-img'>{menu_picture_html(item, 'card', IMAGE_STYLE, CARD_IMAGE_SIZES)}</div>"
+    else:
+        image = "<div class='cd-img cd-img-empty'>[Gambar Menu]</div>"
+    available = item.get('tersedia', True)
+    status = "<span class='cd-ok'>✅ Tersedia</span>" if available else "<span class='cd-out'>🚫 Habis</span>"
+    return (
+        f"<div class='cd-card'>"
+        f"<div class='cd-title'>{escape(item['nama'])}</div>"
+        f"{image}"
+        f"<span class='cd-badge'>{escape(item['kategori'])}</span>"
+        f"<div class='cd-price'>Rp {int(item['harga']):,}</div>"
+        f"{_description(item.get('deskripsi'), 100)}"
+        f"<div class='cd-status {'' if available else 'cd-status-out'}'>{status}<div>{_rating(item)}</div></div>"
+        f"</div>"
+    )
+
+
+def _favorite_card(item: dict) -> str:
+    image = ""
+    if item['url_gambar']:
+        image = f"<div class='cd-thumb'>{menu_picture_html(item, 'thumb', IMAGE_STYLE, '80px')}</div>"
+    return (
+        f"<div class='cd-card cd-compact'>{image}<div class='cd-body'>"
+        f"<strong>{escape(item['nama'])}</strong><br>"
+        f"<span class='cd-badge'>{escape(item['kategori'])}</span>"
+        f"<div class='cd-price'>Rp {int(item['harga']):,}</div>"
+        f"{_description(item.get('deskripsi'), 60)}"
+        f"<div class='cd-status'>{_rating(item)}</div>"
+        f"</div></div>"
+    )
+
+
+_RENDERERS = {
+    'menu': _menu_card,
+    'favorit': _favorite_card,
+}
+
+
+def card_html(item: dict, varian: str = 'menu') -> str:
+    """HTML kartu `varian` ('menu' untuk grid menu, 'favorit' untuk halaman favorit).
+
+    Hasil disimpan per (id, varian) untuk generasi katalog saat ini; perubahan menu, stok atau
+    statistik memuat ulang katalog sehingga kartu dibangun ulang sekali dengan data baru.
+    """
+    memo = _memo()
+    key = (item['id'], varian)
+    html = memo.get(key)
+    if html is None:
+        html = memo[key] = _RENDERERS[varian](item)
+    return html
@@ -0,0 +1,126 @@
+"""
+Cache katalog dalam proses untuk aplikasi Caffe Dehh
+Menyimpan data yang jarang berubah tetapi sering dibaca (mis. daftar menu) di memori, bersama nomor versinya.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(NamedTuple):
+    data: Any
+    version: int
+    loaded_at: float
+    # Naik setiap kali data dimuat ulang; dipakai sebagai kunci struktur turunan dan memoisasi
+    generation: int
+
+
+class VersionedCache:
+    """Cache satu nilai yang diberi versi, dengan pola stale-while-revalidate.
+
+    - `loader()` memuat data dan mengembalikan `(version, data)`.
+    - `version_fn()` hanya membaca versi terkini (kueri murah).
+
+    Pembaca selalu dilayani dari memori. Jika snapshot lebih tua dari `ttl` detik, satu thread latar
+    memeriksa versi dan memuat ulang hanya jika versi berubah atau data lebih tua dari `max_age`.
+    `invalidate()` dipanggil setelah penulisan di proses ini sehingga pembaca berikutnya langsung
+    mendapat data baru (write-through); proses lain melihat perubahan dalam `ttl` detik.
+    """
+
+    def __init__(self, loader: Callable[[], Tuple[int, Any]], version_fn: Callable[[], int],
+                 ttl: float, max_age: float):
+        self._loader = loader
+        self._version_fn = version_fn
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._snapshot: Snapshot = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._generation = 0
+        # Naik setiap invalidate(); hasil muat yang dimulai sebelum invalidate() dibuang
+        self._invalidations = 0
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+
+    def _load(self) -> Snapshot:
+        """Memuat dan memasang snapshot baru. Mengembalikan None jika invalidate() dipanggil selama
+        pemuatan: data yang dibaca mungkin sudah mendahului penulisan yang memicu invalidate()."""
+        with self._lock:
+            invalidations = self._invalidations
+        version, data = self._loader()
+        with self._lock:
+            if self._invalidations != invalidations:
+                return None
+            self._generation += 1
+            self._snapshot = Snapshot(data, version, time.monotonic(), self._generation)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            snap = self._snapshot
+            stale = snap is not None and time.monotonic() - self._checked_at >= self.ttl
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+
+        if snap is None:
+            # Belum ada data (atau baru di-invalidate): muat sekali, pembaca lain menunggu hasil yang sama
+            with self._load_lock:
+                with self._lock:
+                    snap = self._snapshot
+                while snap is None:
+                    snap = self._load()
+            return snap
+
+        if start_refresh:
+            threading.Thread(target=self._revalidate, daemon=True).start()
+        return snap
+
+    def get(self) -> Any:
+        return self.snapshot().data
+
+    def _revalidate(self):
+        try:
+            with self._lock:
+                snap = self._snapshot
+            if snap is None:
+                return
+            expired = time.monotonic() - snap.loaded_at >= self.max_age
+            if expired or self._version_fn() != snap.version:
+                with self._load_lock:
+                    self._load()
+            else:
+                with self._lock:
+                    self._checked_at = time.monotonic()
+        except Exception:
+            # Tetap sajikan data lama; percobaan berikutnya setelah ttl berikutnya
+            logger.exception("Gagal memperbarui cache katalog")
+            with self._lock:
+                self._checked_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def invalidate(self):
+        """Membuang snapshot sehingga pembacaan berikutnya memuat ulang secara sinkron."""
+        with self._lock:
+            self._invalidations += 1
+            self._snapshot = None
+
+    def derive(self, name: str, builder: Callable[[Any], Any]) -> Any:
+        """Struktur turunan dari data (mis. indeks pencarian) yang hanya dibangun ulang saat data dimuat ulang."""
+        snap = self.snapshot()
+        with self._lock:
+            cached = self._derived.get(name)
+        if cached and cached[0] == snap.generation:
+            return cached[1]
+        value = builder(snap.data)
+        with self._lock:
+            self._derived[name] = (snap.generation, value)
+        return value
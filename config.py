@@ -23,3 +23,59 @@ STORAGE_BUCKET = os.getenv("SUPABASE_BUCKET", "menu-images")
 # Penjenamaan dasar
 APP_TITLE = "Pesanan Kafe"
 BRAND = "Caffe Dehh"
+
+# Pool koneksi database (dibagi oleh semua sesi dalam satu proses)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Batas waktu (detik) menunggu koneksi kosong sebelum menyerah
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Koneksi yang menganggur lebih lama dari ini diperiksa dengan `SELECT 1` sebelum dipakai
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+
+# Jumlah pesanan per halaman pada antrean pesanan admin
+ORDER_PAGE_SIZE = int(os.getenv("ORDER_PAGE_SIZE", "20"))
+
+# Jumlah kartu menu yang ditampilkan per "Muat lebih banyak" (kelipatan 3 agar baris grid penuh)
+MENU_PAGE_SIZE = int(os.getenv("MENU_PAGE_SIZE", "12"))
+
+# Pencarian menu per ketikan: kueri yang lebih pendek dari ini dilayani indeks dalam memori saja,
+# yang lebih panjang juga dicari dengan teks penuh di database (hasil disimpan per kueri)
+SEARCH_MIN_CHARS = int(os.getenv("SEARCH_MIN_CHARS", "2"))
+
+# Perubahan favorit ditulis ke database per sesi ketika terkumpul FAVORITE_FLUSH_MAX perubahan atau
+# FAVORITE_FLUSH_INTERVAL detik setelah perubahan pertama, serta saat berpindah halaman/tab atau logout
+FAVORITE_FLUSH_MAX = int(os.getenv("FAVORITE_FLUSH_MAX", "20"))
+FAVORITE_FLUSH_INTERVAL = float(os.getenv("FAVORITE_FLUSH_INTERVAL", "30"))
+
+# Cache katalog menu dalam proses (detik): setelah CATALOG_TTL versi katalog diperiksa ulang di latar,
+# dan data dimuat ulang paling lambat setiap CATALOG_MAX_AGE (statistik rating/favorit/terjual ikut segar)
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "30"))
+CATALOG_MAX_AGE = float(os.getenv("CATALOG_MAX_AGE", "300"))
+
+# Masa cache (detik) gambar menu di browser/CDN. Nama objek berdasarkan hash isinya sehingga
+# tidak pernah berubah isi dan boleh di-cache selama mungkin.
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Unggahan gambar menu di latar (lihat upload_service.py)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+# Jeda awal (detik) sebelum mencoba ulang; berlipat dua setiap percobaan
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "1"))
+# Unggahan yang belum selesai setelah sekian menit dianggap gagal (mis. proses mati di tengah unggahan)
+UPLOAD_STALE_MINUTES = float(os.getenv("UPLOAD_STALE_MINUTES", "30"))
+
+# Token sesi bertanda tangan (lihat session_tokens.py). Tanpa SESSION_SECRET, kunci acak dibuat per
+# proses sehingga sesi tidak bertahan setelah aplikasi dimulai ulang atau di antara beberapa replika.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+# Masa berlaku token (detik); default satu shift kerja
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 3600)))
+# Selang (detik) setiap proses membaca pencabutan sesi baru dari tabel sesi_dicabut
+SESSION_REVOCATION_REFRESH = float(os.getenv("SESSION_REVOCATION_REFRESH", "5"))
+
+# Antrean pesanan (lihat order_queue.py): pesanan checkout dikumpulkan dan ditulis dalam satu transaksi.
+# Sebuah batch ditulis ketika berisi ORDER_BATCH_MAX pesanan atau ORDER_FLUSH_INTERVAL_MS setelah
+# pesanan pertamanya masuk, mana yang lebih dulu.
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "50"))
+ORDER_FLUSH_INTERVAL_MS = float(os.getenv("ORDER_FLUSH_INTERVAL_MS", "20"))
+# Batas waktu (detik) checkout menunggu pesanannya ditulis
+ORDER_SUBMIT_TIMEOUT = float(os.getenv("ORDER_SUBMIT_TIMEOUT", "10"))
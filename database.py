@@ -5,111 +5,76 @@ Berisi semua operasi CRUD dan fungsi untuk fitur-fitur baru.
 
 import streamlit as st
 import psycopg2
+from psycopg2.extras import Json, execute_values
 import json
+import re
 import hashlib
-from datetime import datetime
-from typing import List, Dict, Any
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+from config import (
+    DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_IDLE,
+    CATALOG_TTL, CATALOG_MAX_AGE, UPLOAD_STALE_MINUTES, SEARCH_MIN_CHARS,
+)
+from db_pool import ConnectionPool
+from catalog import VersionedCache
+from search_index import TypeaheadIndex
 
 # -------------------- UTILITAS DATABASE --------------------
 
+@st.cache_resource(show_spinner=False)
+def get_pool() -> ConnectionPool:
+    """Ukuran dan batas waktu pool diatur lewat DB_POOL_* di config."""
+    return ConnectionPool(
+        DB_POOL_MIN,
+        DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE,
+        host=DB_HOST,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASS,
+        port=DB_PORT,
+        connect_timeout=10,
+        sslmode='require'
+    )
+
+@contextmanager
 def get_db_conn():
-    """Mendapatkan koneksi database - membuat koneksi baru setiap kali"""
+    """Meminjam koneksi dari pool dan mengembalikannya setelah blok `with` selesai.
+
+    Transaksi yang belum di-commit akan di-rollback saat koneksi dikembalikan.
+    """
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST, 
-            dbname=DB_NAME, 
-            user=DB_USER, 
-            password=DB_PASS, 
-            port=DB_PORT,
-            connect_timeout=10,
-            sslmode='require'
-        )
-        return conn
+        pool = get_pool()
+        conn = pool.getconn()
     except Exception as e:
         st.error(f"Kesalahan koneksi DB: {e}")
-        return None
-
-def hash_password(raw: str) -> str:
-    return hashlib.sha256(raw.encode()).hexdigest()
+        raise
 
-def init_db():
-    """Membuat tabel jika belum ada. Dijalankan sekali saat startup."""
-    conn = None
-    cur = None
+    broken = False
     try:
-        conn = get_db_conn()
-        if not conn:
-            return False
-        
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS pengguna (
-                id SERIAL PRIMARY KEY,
-                nama_pengguna TEXT UNIQUE NOT NULL,
-                kata_sandi TEXT NOT NULL,
-                peran TEXT NOT NULL DEFAULT 'user'
-            );
-            CREATE TABLE IF NOT EXISTS menu (
-                id SERIAL PRIMARY KEY,
-                nama TEXT NOT NULL,
-                kategori TEXT NOT NULL,
-                deskripsi TEXT,
-                harga NUMERIC NOT NULL,
-                url_gambar TEXT,
-                tersedia BOOLEAN DEFAULT TRUE
-            );
-            CREATE TABLE IF NOT EXISTS promo (
-                id SERIAL PRIMARY KEY,
-                kode TEXT UNIQUE NOT NULL,
-                jumlah_diskon NUMERIC NOT NULL,
-                aktif BOOLEAN DEFAULT TRUE
-            );
-            CREATE TABLE IF NOT EXISTS pesanan (
-                id SERIAL PRIMARY KEY,
-                id_pengguna INTEGER REFERENCES pengguna(id),
-                item JSONB,
-                total NUMERIC,
-                status TEXT DEFAULT 'Tertunda',
-                metode_pembayaran TEXT,
-                dibuat_pada TIMESTAMP DEFAULT NOW()
-            );
-            CREATE TABLE IF NOT EXISTS ulasan (
-                id SERIAL PRIMARY KEY,
-                id_pengguna INTEGER REFERENCES pengguna(id),
-                id_menu INTEGER REFERENCES menu(id),
-                rating INTEGER CHECK (rating >= 1 AND rating <= 5),
-                teks_ulasan TEXT,
-                dibuat_pada TIMESTAMP DEFAULT NOW()
-            );
-            CREATE TABLE IF NOT EXISTS menu_favorit (
-                id SERIAL PRIMARY KEY,
-                id_pengguna INTEGER REFERENCES pengguna(id),
-                id_menu INTEGER REFERENCES menu(id),
-                UNIQUE(id_pengguna, id_menu)
-            );
-            """
-        )
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Kesalahan inisialisasi database: {e}")
-        if conn:
-            conn.rollback()
-        return False
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Koneksi kemungkinan putus; jangan dikembalikan ke pool
+        broken = True
+        raise
     finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        pool.putconn(conn, discard=broken)
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Statistik pool koneksi (dipakai, menganggur, waktu tunggu, handshake yang dihindari)."""
+    return get_pool().stats()
+
+def hash_password(raw: str) -> str:
+    return hashlib.sha256(raw.encode()).hexdigest()
 
 # -------------------- FUNGSI PENGGUNA --------------------
 # (Fungsi Pengguna, Promo, Pesanan, Ulasan tidak berubah secara signifikan, jadi disingkat)
 def create_user(username: str, password: str, role: str = 'user'):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    try:
+    with get_db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             "INSERT INTO pengguna (nama_pengguna, kata_sandi, peran) VALUES (%s, %s, %s) RETURNING id",
             (username, hash_password(password), role),
@@ -117,20 +82,13 @@ def create_user(username: str, password: str, role: str = 'user'):
         uid = cur.fetchone()[0]
         conn.commit()
         return uid
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+
+AUTHENTICATE_SQL = "SELECT id, kata_sandi, peran FROM pengguna WHERE nama_pengguna = %(username)s"
 
 def authenticate(username: str, password: str):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, kata_sandi, peran FROM pengguna WHERE nama_pengguna = %s", (username,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(AUTHENTICATE_SQL, {"username": username})
+        row = cur.fetchone()
     if not row:
         return None
     uid, pwd_hash, role = row
@@ -139,331 +97,815 @@ def authenticate(username: str, password: str):
     return None
 
 def user_exists(username: str) -> bool:
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM pengguna WHERE nama_pengguna = %s", (username,))
-    exists = cur.fetchone() is not None
-    cur.close()
-    conn.close()
-    return exists
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM pengguna WHERE nama_pengguna = %s", (username,))
+        return cur.fetchone() is not None
 
 def update_user_password(username: str, new_password: str):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    try:
+    with get_db_conn() as conn, conn.cursor() as cur:
         hashed_password = hash_password(new_password)
         cur.execute("UPDATE pengguna SET kata_sandi = %s WHERE nama_pengguna = %s", (hashed_password, username))
         conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
 
 def read_users():
-    conn = get_db_conn()
-    if conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id, nama_pengguna, peran FROM pengguna ORDER BY id ASC")
-            result = cursor.fetchall()
-        conn.close()
-        return result
-    return []
+    with get_db_conn() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT id, nama_pengguna, peran FROM pengguna ORDER BY id ASC")
+        return cursor.fetchall()
 
 def update_user_role(username, new_role):
-    conn = get_db_conn()
-    if conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "UPDATE pengguna SET peran=%s WHERE nama_pengguna=%s",
-                (new_role, username)
-            )
+    with get_db_conn() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "UPDATE pengguna SET peran=%s WHERE nama_pengguna=%s",
+            (new_role, username)
+        )
         conn.commit()
-        conn.close()
 
 def delete_user(username):
-    conn = get_db_conn()
-    if conn:
-        with conn.cursor() as cursor:
-            cursor.execute("DELETE FROM pengguna WHERE nama_pengguna=%s", (username,))
+    with get_db_conn() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM pengguna WHERE nama_pengguna=%s", (username,))
         conn.commit()
-        conn.close()
+
+def save_session_revocation(jti: str, username: str, revoked_at: float, expires: float):
+    """Mencatat pencabutan satu token (`jti`) atau semua token `username`; baris kedaluwarsa ikut dibuang."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM sesi_dicabut WHERE kedaluwarsa < %s", (revoked_at,))
+        cur.execute(
+            "INSERT INTO sesi_dicabut (jti, nama_pengguna, dicabut_pada, kedaluwarsa) VALUES (%s, %s, %s, %s)",
+            (jti, username, revoked_at, expires),
+        )
+        conn.commit()
+
+def load_session_revocations(now: float) -> List[Tuple[str, str, float, float]]:
+    """(jti, nama_pengguna, dicabut_pada, kedaluwarsa) semua pencabutan yang masih berlaku."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT jti, nama_pengguna, dicabut_pada, kedaluwarsa FROM sesi_dicabut WHERE kedaluwarsa > %s",
+            (now,),
+        )
+        return cur.fetchall()
 # -------------------- FUNGSI MENU --------------------
 
-def get_all_menu(search: str = "", user_id: int = None) -> List[Dict[str, Any]]:
-    conn = get_db_conn()
-    cur = conn.cursor()
-    
-    # Kueri ini sekarang juga mengambil status 'tersedia' dan apakah menu ini favorit pengguna
-    base_query = """
-        SELECT 
-            m.id, m.nama, m.kategori, m.deskripsi, m.harga, m.url_gambar, m.tersedia,
-            COALESCE(AVG(u.rating), 0) as rating_rata_rata,
-            COUNT(u.id) as jumlah_ulasan,
-            CASE WHEN f.id_menu IS NOT NULL THEN TRUE ELSE FALSE END as is_favorite
-        FROM menu m
-        LEFT JOIN ulasan u ON m.id = u.id_menu
-        LEFT JOIN menu_favorit f ON m.id = f.id_menu AND f.id_pengguna = %(user_id)s
+def _menu_row_to_dict(r) -> Dict[str, Any]:
+    return {
+        "id": r[0], "nama": r[1], "kategori": r[2], "deskripsi": r[3], "harga": float(r[4]),
+        "url_gambar": r[5], "tersedia": r[6], "rating_rata_rata": float(r[7]),
+        "jumlah_ulasan": int(r[8]), "distribusi_rating": list(r[9:14]),
+        "jumlah_favorit": int(r[14]), "jumlah_terjual": int(r[15]), "gambar_varian": r[16],
+        "status_gambar": r[17], "unggahan_mulai": r[18],
+    }
+
+# Kolom menu beserta statistik yang sudah dihitung sebelumnya di menu_stats (lihat _bump_menu_stats)
+MENU_COLUMNS = """
+    m.id, m.nama, m.kategori, m.deskripsi, m.harga, m.url_gambar, m.tersedia,
+    COALESCE(s.rating_rata_rata, 0), COALESCE(s.jumlah_ulasan, 0),
+    COALESCE(s.rating_1, 0), COALESCE(s.rating_2, 0), COALESCE(s.rating_3, 0),
+    COALESCE(s.rating_4, 0), COALESCE(s.rating_5, 0),
+    COALESCE(s.jumlah_favorit, 0), COALESCE(s.jumlah_terjual, 0), m.gambar_varian,
+    m.status_gambar, m.unggahan_mulai
+"""
+
+MENU_CATALOG_SQL = f"""
+    SELECT {MENU_COLUMNS}
+    FROM menu m
+    LEFT JOIN menu_stats s ON s.id_menu = m.id
+    ORDER BY m.kategori, m.nama
+"""
+
+def _read_catalog_version() -> int:
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT versi FROM katalog_versi")
+        return cur.fetchone()[0]
+
+def _load_menu_catalog() -> Tuple[int, Tuple[Dict[str, Any], ...]]:
+    """Memuat seluruh katalog menu (tanpa data per pengguna) beserta versinya dalam satu transaksi."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute("SELECT versi FROM katalog_versi")
+        version = cur.fetchone()[0]
+        cur.execute(MENU_CATALOG_SQL)
+        rows = cur.fetchall()
+    return version, tuple(_menu_row_to_dict(r) for r in rows)
+
+def _bump_catalog_version(cur):
+    """Dipanggil di dalam transaksi setiap penulisan tabel menu."""
+    cur.execute("UPDATE katalog_versi SET versi = versi + 1")
+
+# Katalog menu dibagi oleh semua sesi dalam satu proses; hanya dibaca ulang saat versinya berubah
+menu_catalog = VersionedCache(_load_menu_catalog, _read_catalog_version, ttl=CATALOG_TTL, max_age=CATALOG_MAX_AGE)
+
+def _with_favorites(items, favorite_ids) -> List[Dict[str, Any]]:
+    # Salinan dangkal agar pemanggil tidak mengubah data di cache
+    return [dict(item, is_favorite=item["id"] in favorite_ids) for item in items]
+
+def get_all_menu(user_id: int = None) -> List[Dict[str, Any]]:
+    """Menu dari cache katalog, dengan status favorit pengguna ditumpangkan di atasnya."""
+    favorite_ids = get_user_favorite_ids(user_id) if user_id else set()
+    return _with_favorites(menu_catalog.get(), favorite_ids)
+
+def get_catalog_items(menu_ids) -> List[Dict[str, Any]]:
+    """Item katalog untuk id yang diberikan, dengan urutan yang sama (mis. urutan relevansi pencarian)."""
+    by_id = {item["id"]: item for item in menu_catalog.get()}
+    return [dict(by_id[mid]) for mid in menu_ids if mid in by_id]
+
+# Kunci urutan untuk query_menu: (fungsi kunci, menurun). 'relevan' mempertahankan urutan masukan,
+# yaitu urutan relevansi hasil pencarian atau kategori, nama untuk seluruh katalog.
+MENU_SORTS = {
+    "relevan": None,
+    "nama": (lambda item: item["nama"].lower(), False),
+    "harga_asc": (lambda item: item["harga"], False),
+    "harga_desc": (lambda item: item["harga"], True),
+    "rating": (lambda item: (item["rating_rata_rata"], item["jumlah_ulasan"]), True),
+    "popularitas": (lambda item: (item["jumlah_terjual"], item["jumlah_favorit"]), True),
+}
+
+def query_menu(category: str = None, sort: str = "relevan", menu_ids: List[int] = None,
+               offset: int = 0, limit: int = None) -> Dict[str, Any]:
+    """Menu dari cache katalog dengan filter kategori, urutan dan paginasi.
+
+    `menu_ids` membatasi hasil ke id tertentu (mis. hasil pencarian, berurutan menurut relevansi).
+    Mengembalikan dict: items (hanya potongan yang diminta), total (jumlah setelah filter kategori)
+    dan facets ({kategori: jumlah} sebelum filter kategori, untuk pilihan kategori).
     """
-    
-    params = {'user_id': user_id}
-
-    if search:
-        query = base_query + " WHERE LOWER(m.nama) LIKE LOWER(%(search)s) GROUP BY m.id, f.id_menu ORDER BY m.kategori, m.nama"
-        params['search'] = f"%{search}%"
-    else:
-        query = base_query + " GROUP BY m.id, f.id_menu ORDER BY m.kategori, m.nama"
-        
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [
-        {"id": r[0], "nama": r[1], "kategori": r[2], "deskripsi": r[3], "harga": float(r[4]), 
-         "url_gambar": r[5], "tersedia": r[6], "rating_rata_rata": float(r[7]), 
-         "jumlah_ulasan": int(r[8]), "is_favorite": r[9]}
-        for r in rows
-    ]
+    if sort not in MENU_SORTS:
+        raise ValueError(f"Urutan tidak dikenal: {sort}")
+    items = menu_catalog.get() if menu_ids is None else get_catalog_items(menu_ids)
+
+    facets = Counter(item["kategori"] for item in items)
+    if category:
+        items = [item for item in items if item["kategori"] == category]
+    if MENU_SORTS[sort]:
+        key, descending = MENU_SORTS[sort]
+        items = sorted(items, key=key, reverse=descending)
+
+    end = None if limit is None else offset + limit
+    return {
+        "items": [dict(item) for item in items[offset:end]],
+        "total": len(items),
+        "facets": dict(sorted(facets.items())),
+    }
+
+def get_typeahead_index() -> TypeaheadIndex:
+    """Indeks pencarian ketik-langsung; dibangun ulang hanya ketika katalog dimuat ulang."""
+    return menu_catalog.derive("typeahead", TypeaheadIndex)
+
+# Setiap kata pencarian menjadi awalan (kata:*) yang diperluas dengan sinonimnya, lalu semua kata digabung
+# dengan AND. Bobot vektor: nama (A) > kategori (B) > deskripsi (C).
+SEARCH_MENU_SQL = """
+    WITH kata AS (
+        SELECT k, urutan FROM unnest(%(terms)s::TEXT[]) WITH ORDINALITY AS t(k, urutan)
+    ),
+    perluasan AS (
+        SELECT kata.urutan, string_agg(DISTINCT quote_literal(alt.k) || ':*', ' | ') AS pilihan
+        FROM kata
+        CROSS JOIN LATERAL (
+            SELECT kata.k
+            UNION
+            SELECT s2.kata FROM sinonim_pencarian s1
+            JOIN sinonim_pencarian s2 ON s2.grup = s1.grup
+            WHERE s1.kata = kata.k
+        ) alt
+        GROUP BY kata.urutan
+    ),
+    kueri AS (
+        SELECT to_tsquery('menu_search', string_agg('(' || pilihan || ')', ' & ')) AS q FROM perluasan
+    )
+    SELECT m.id, ts_rank_cd(m.vektor_pencarian, kueri.q) AS skor
+    FROM menu m, kueri
+    WHERE m.vektor_pencarian @@ kueri.q
+    ORDER BY skor DESC, m.nama
+    LIMIT %(limit)s
+"""
+
+def search_menu_ids(query: str, limit: int = 50) -> List[int]:
+    """Pencarian teks penuh atas nama, kategori dan deskripsi menu; id dikembalikan urut relevansi."""
+    terms = re.findall(r"\w+", query.lower())[:8]
+    if not terms:
+        return []
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(SEARCH_MENU_SQL, {"terms": terms, "limit": limit})
+        return [r[0] for r in cur.fetchall()]
+
+# Batas jumlah kueri yang hasil teks penuhnya disimpan per generasi katalog
+SEARCH_MEMO_SIZE = 1000
+
+def search_menu(query: str) -> List[int]:
+    """Id menu yang cocok dengan `query` untuk pencarian per ketikan, urut relevansi.
+
+    Hasil teks penuh (peringkat, stemming, sinonim) didahulukan, disusul kecocokan indeks dalam memori
+    yang belum termasuk (mis. potongan di tengah kata). Database hanya ditanya untuk kueri minimal
+    SEARCH_MIN_CHARS huruf, dan hasilnya disimpan per kueri sampai katalog dimuat ulang.
+    """
+    index_ids = get_typeahead_index().search(query)
+    key = " ".join(re.findall(r"\w+", query.lower()))
+    if len(key.replace(" ", "")) < SEARCH_MIN_CHARS:
+        return index_ids
+    memo = menu_catalog.derive("hasil_pencarian", lambda _: {})
+    ranked = memo.get(key)
+    if ranked is None:
+        ranked = search_menu_ids(query)
+        if len(memo) >= SEARCH_MEMO_SIZE:
+            memo.clear()
+        memo[key] = ranked
+    seen = set(ranked)
+    return ranked + [mid for mid in index_ids if mid not in seen]
 
 def update_menu_availability(menu_id: int, is_available: bool):
     """Mengubah status ketersediaan menu."""
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE menu SET tersedia = %s WHERE id = %s", (is_available, menu_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE menu SET tersedia = %s WHERE id = %s", (is_available, menu_id))
+        _bump_catalog_version(cur)
+        conn.commit()
+    menu_catalog.invalidate()
+
+# -------------------- STATISTIK MENU --------------------
+
+def _bump_menu_stats(cur, menu_id: int, ulasan: int = 0, rating: int = None, favorit: int = 0, terjual: int = 0):
+    """Memperbarui baris menu_stats secara inkremental di dalam transaksi pemanggil.
+    `ulasan` bernilai +1/-1 bersama `rating` (1-5) untuk histogram rating."""
+    histogram = [ulasan if rating == n else 0 for n in range(1, 6)]
+    cur.execute(
+        """
+        INSERT INTO menu_stats (
+            id_menu, jumlah_ulasan, total_rating,
+            rating_1, rating_2, rating_3, rating_4, rating_5,
+            jumlah_favorit, jumlah_terjual
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (id_menu) DO UPDATE SET
+            jumlah_ulasan = menu_stats.jumlah_ulasan + EXCLUDED.jumlah_ulasan,
+            total_rating = menu_stats.total_rating + EXCLUDED.total_rating,
+            rating_1 = menu_stats.rating_1 + EXCLUDED.rating_1,
+            rating_2 = menu_stats.rating_2 + EXCLUDED.rating_2,
+            rating_3 = menu_stats.rating_3 + EXCLUDED.rating_3,
+            rating_4 = menu_stats.rating_4 + EXCLUDED.rating_4,
+            rating_5 = menu_stats.rating_5 + EXCLUDED.rating_5,
+            jumlah_favorit = menu_stats.jumlah_favorit + EXCLUDED.jumlah_favorit,
+            jumlah_terjual = menu_stats.jumlah_terjual + EXCLUDED.jumlah_terjual,
+            diperbarui_pada = NOW()
+        """,
+        (menu_id, ulasan, ulasan * (rating or 0), *histogram, favorit, terjual),
+    )
+
+def _bump_units_sold(cur, order_id: int, sign: int):
+    """Menambah (sign=1) atau mengurangi (sign=-1) jumlah_terjual untuk semua item sebuah pesanan."""
+    cur.execute(
+        """
+        INSERT INTO menu_stats (id_menu, jumlah_terjual)
+        SELECT (e->>'id_menu')::INTEGER, SUM((e->>'qty')::INTEGER) * %s
+        FROM pesanan p, jsonb_array_elements(p.item) e
+        WHERE p.id = %s AND e ? 'id_menu'
+          AND EXISTS (SELECT 1 FROM menu WHERE id = (e->>'id_menu')::INTEGER)
+        GROUP BY 1
+        ON CONFLICT (id_menu) DO UPDATE SET
+            jumlah_terjual = menu_stats.jumlah_terjual + EXCLUDED.jumlah_terjual,
+            diperbarui_pada = NOW()
+        """,
+        (sign, order_id),
+    )
+
+def rebuild_menu_stats():
+    """Menghitung ulang seluruh menu_stats dari ulasan, menu_favorit dan pesanan Selesai.
+    Untuk memperbaiki penyimpangan, mis. setelah data diubah langsung di database."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("LOCK TABLE menu_stats IN EXCLUSIVE MODE")
+        cur.execute("DELETE FROM menu_stats")
+        cur.execute("""
+            INSERT INTO menu_stats (
+                id_menu, jumlah_ulasan, total_rating,
+                rating_1, rating_2, rating_3, rating_4, rating_5,
+                jumlah_favorit, jumlah_terjual
+            )
+            SELECT
+                m.id, COALESCE(u.jumlah, 0), COALESCE(u.total, 0),
+                COALESCE(u.r1, 0), COALESCE(u.r2, 0), COALESCE(u.r3, 0), COALESCE(u.r4, 0), COALESCE(u.r5, 0),
+                COALESCE(f.jumlah, 0), COALESCE(t.jumlah, 0)
+            FROM menu m
+            LEFT JOIN (
+                SELECT id_menu, COUNT(rating) AS jumlah, SUM(rating) AS total,
+                       COUNT(*) FILTER (WHERE rating = 1) AS r1, COUNT(*) FILTER (WHERE rating = 2) AS r2,
+                       COUNT(*) FILTER (WHERE rating = 3) AS r3, COUNT(*) FILTER (WHERE rating = 4) AS r4,
+                       COUNT(*) FILTER (WHERE rating = 5) AS r5
+                FROM ulasan GROUP BY id_menu
+            ) u ON u.id_menu = m.id
+            LEFT JOIN (
+                SELECT id_menu, COUNT(*) AS jumlah FROM menu_favorit GROUP BY id_menu
+            ) f ON f.id_menu = m.id
+            LEFT JOIN (
+                SELECT (e->>'id_menu')::INTEGER AS id_menu, SUM((e->>'qty')::INTEGER) AS jumlah
+                FROM pesanan p, jsonb_array_elements(p.item) e
+                WHERE p.status = 'Selesai' AND e ? 'id_menu'
+                GROUP BY 1
+            ) t ON t.id_menu = m.id
+        """)
+        conn.commit()
 
 # -------------------- FUNGSI MENU FAVORIT --------------------
 
-def add_to_favorites(user_id: int, menu_id: int):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO menu_favorit (id_pengguna, id_menu) VALUES (%s, %s) ON CONFLICT DO NOTHING", (user_id, menu_id))
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def remove_from_favorites(user_id: int, menu_id: int):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM menu_favorit WHERE id_pengguna = %s AND id_menu = %s", (user_id, menu_id))
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def get_favorite_menus(user_id: int) -> List[Dict[str, Any]]:
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT 
-            m.id, m.nama, m.kategori, m.deskripsi, m.harga, m.url_gambar, m.tersedia,
-            COALESCE(AVG(u.rating), 0) as rating_rata_rata,
-            COUNT(u.id) as jumlah_ulasan
-        FROM menu_favorit f
-        JOIN menu m ON f.id_menu = m.id
-        LEFT JOIN ulasan u ON m.id = u.id_menu
-        WHERE f.id_pengguna = %s
-        GROUP BY m.id
-        ORDER BY m.nama
-    """, (user_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [
-        {"id": r[0], "nama": r[1], "kategori": r[2], "deskripsi": r[3], "harga": float(r[4]), 
-         "url_gambar": r[5], "tersedia": r[6], "rating_rata_rata": float(r[7]), 
-         "jumlah_ulasan": int(r[8]), "is_favorite": True}
-        for r in rows
-    ]
+def apply_favorite_changes(user_id: int, changes: Dict[int, bool]):
+    """Menerapkan sekumpulan perubahan favorit ({id_menu: True untuk tambah, False untuk hapus})
+    dalam satu pernyataan, termasuk penyesuaian jumlah_favorit di menu_stats.
+    Idempoten: menambah favorit yang sudah ada atau menghapus yang tidak ada tidak mengubah apa pun."""
+    if not changes:
+        return
+    menu_ids = [int(mid) for mid in changes]
+    adds = [bool(changes[mid]) for mid in changes]
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            WITH perubahan AS (
+                SELECT * FROM unnest(%(menu_ids)s::INTEGER[], %(adds)s::BOOLEAN[]) AS t(id_menu, tambah)
+            ),
+            dihapus AS (
+                DELETE FROM menu_favorit f USING perubahan p
+                WHERE f.id_pengguna = %(user_id)s AND f.id_menu = p.id_menu AND NOT p.tambah
+                RETURNING f.id_menu, -1 AS selisih
+            ),
+            ditambah AS (
+                INSERT INTO menu_favorit (id_pengguna, id_menu)
+                SELECT %(user_id)s, p.id_menu FROM perubahan p JOIN menu m ON m.id = p.id_menu
+                WHERE p.tambah
+                ON CONFLICT (id_pengguna, id_menu) DO NOTHING
+                RETURNING id_menu, 1 AS selisih
+            )
+            INSERT INTO menu_stats (id_menu, jumlah_favorit)
+            SELECT id_menu, SUM(selisih)
+            FROM (SELECT * FROM dihapus UNION ALL SELECT * FROM ditambah) d
+            GROUP BY id_menu
+            ON CONFLICT (id_menu) DO UPDATE SET
+                jumlah_favorit = menu_stats.jumlah_favorit + EXCLUDED.jumlah_favorit,
+                diperbarui_pada = NOW()
+            """,
+            {"user_id": user_id, "menu_ids": menu_ids, "adds": adds},
+        )
+        conn.commit()
 
-# -------------------- FUNGSI ANALITIK --------------------
+FAVORITE_IDS_SQL = "SELECT id_menu FROM menu_favorit WHERE id_pengguna = %(user_id)s"
 
-def get_sales_data():
-    """Mengambil data penjualan untuk grafik."""
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT 
-            DATE(dibuat_pada) as tanggal, 
-            SUM(total) as total_pendapatan
-        FROM pesanan
-        WHERE status = 'Selesai'
-        GROUP BY DATE(dibuat_pada)
-        ORDER BY tanggal ASC;
-    """)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+def get_user_favorite_ids(user_id: int) -> set:
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(FAVORITE_IDS_SQL, {"user_id": user_id})
+        return {r[0] for r in cur.fetchall()}
 
-def get_top_selling_items():
-    """Mengambil item menu terlaris."""
-    conn = get_db_conn()
-    cur = conn.cursor()
-    # Kueri ini sedikit rumit karena harus "membongkar" JSON
-    cur.execute("""
-        SELECT 
-            (item_data->>'nama')::TEXT as nama_menu,
-            SUM((item_data->>'qty')::INTEGER) as jumlah_terjual
-        FROM pesanan, jsonb_array_elements(item) as item_data
-        WHERE pesanan.status = 'Selesai'
-        GROUP BY nama_menu
-        ORDER BY jumlah_terjual DESC
-        LIMIT 10;
-    """)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
-
-# (Tambahkan fungsi-fungsi lain yang sudah ada di sini seperti create_menu_item, create_order, dll.)
-def get_menu_item(menu_id: int):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, nama, kategori, deskripsi, harga, url_gambar FROM menu WHERE id = %s", (menu_id,))
-    r = cur.fetchone()
-    cur.close()
-    conn.close()
-    if not r:
-        return None
-    return {"id": r[0], "nama": r[1], "kategori": r[2], "deskripsi": r[3], "harga": float(r[4]), "url_gambar": r[5]}
+def get_favorite_menus(user_id: int, favorite_ids: set = None) -> List[Dict[str, Any]]:
+    """Menu favorit pengguna dari cache katalog. `favorite_ids` dapat diberikan dari sesi agar tidak perlu kueri."""
+    if favorite_ids is None:
+        favorite_ids = get_user_favorite_ids(user_id)
+    items = [item for item in menu_catalog.get() if item["id"] in favorite_ids]
+    items.sort(key=lambda item: item["nama"])
+    return _with_favorites(items, favorite_ids)
+
+# -------------------- FUNGSI ANALITIK --------------------
 
-def create_menu_item(name, category, description, price, image_url=None):
-    conn = get_db_conn()
-    cur = conn.cursor()
+def _bump_sales_rollup(cur, order_id: int, sign: int):
+    """Menambah (sign=1) atau mengurangi (sign=-1) pendapatan pesanan pada jam pembuatannya di penjualan_per_jam."""
     cur.execute(
-        "INSERT INTO menu (nama, kategori, deskripsi, harga, url_gambar) VALUES (%s,%s,%s,%s,%s) RETURNING id",
-        (name, category, description, price, image_url),
+        """
+        INSERT INTO penjualan_per_jam (jam, pendapatan, jumlah_pesanan)
+        SELECT date_trunc('hour', dibuat_pada), COALESCE(total, 0) * %s, %s
+        FROM pesanan WHERE id = %s AND dibuat_pada IS NOT NULL
+        ON CONFLICT (jam) DO UPDATE SET
+            pendapatan = penjualan_per_jam.pendapatan + EXCLUDED.pendapatan,
+            jumlah_pesanan = penjualan_per_jam.jumlah_pesanan + EXCLUDED.jumlah_pesanan
+        """,
+        (sign, sign, order_id),
     )
-    mid = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
+
+def rebuild_sales_rollup():
+    """Menghitung ulang seluruh penjualan_per_jam dari pesanan Selesai."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("LOCK TABLE penjualan_per_jam IN EXCLUSIVE MODE")
+        cur.execute("DELETE FROM penjualan_per_jam")
+        cur.execute("""
+            INSERT INTO penjualan_per_jam (jam, pendapatan, jumlah_pesanan)
+            SELECT date_trunc('hour', dibuat_pada), COALESCE(SUM(total), 0), COUNT(*)
+            FROM pesanan
+            WHERE status = 'Selesai' AND dibuat_pada IS NOT NULL
+            GROUP BY 1
+        """)
+        conn.commit()
+
+# Granularitas yang didukung oleh get_sales_rollup (nilai yang valid untuk date_trunc)
+SALES_GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+SALES_ROLLUP_SQL = """
+    SELECT 
+        date_trunc(%(granularity)s, jam) as periode,
+        SUM(pendapatan) as total_pendapatan,
+        SUM(jumlah_pesanan) as jumlah_pesanan
+    FROM penjualan_per_jam
+    WHERE jam >= %(start)s AND jam < %(end)s
+    GROUP BY periode
+    ORDER BY periode ASC
+"""
+
+def get_sales_rollup(start: date, end: date, granularity: str = 'day'):
+    """Pendapatan dan jumlah pesanan Selesai per periode dalam rentang [start, end] (inklusif).
+    Dibaca dari rollup penjualan_per_jam, jadi jumlah baris yang dibaca sebanding dengan jumlah jam, bukan pesanan."""
+    if granularity not in SALES_GRANULARITIES:
+        raise ValueError(f"Granularitas tidak dikenal: {granularity}")
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(SALES_ROLLUP_SQL, {"granularity": granularity, "start": start, "end": end + timedelta(days=1)})
+        return cur.fetchall()
+
+TOP_SELLING_SQL = """
+    SELECT 
+        COALESCE(m.nama, pi.nama) as nama_menu,
+        SUM(pi.qty) as jumlah_terjual
+    FROM pesanan_item pi
+    JOIN pesanan p ON p.id = pi.id_pesanan
+    LEFT JOIN menu m ON m.id = pi.id_menu
+    WHERE p.status = 'Selesai'
+    GROUP BY pi.id_menu, COALESCE(m.nama, pi.nama)
+    ORDER BY jumlah_terjual DESC
+    LIMIT 10
+"""
+
+def get_top_selling_items():
+    """Mengambil item menu terlaris dari baris pesanan_item.
+    Dikelompokkan per id menu agar menu yang diganti namanya tidak terpecah; nama yang ditampilkan adalah nama terkini."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(TOP_SELLING_SQL)
+        return cur.fetchall()
+
+MENU_ITEMS_SQL = "SELECT id, nama, kategori, deskripsi, harga, url_gambar, tersedia FROM menu WHERE id = ANY(%(menu_ids)s)"
+
+def get_menu_items(menu_ids) -> Dict[int, Dict[str, Any]]:
+    """Mengambil banyak item menu dalam satu kueri, dikembalikan sebagai dict berdasarkan id.
+    Id yang tidak ditemukan (mis. menu sudah dihapus) tidak ada di hasil."""
+    ids = sorted({int(i) for i in menu_ids})
+    if not ids:
+        return {}
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(MENU_ITEMS_SQL, {"menu_ids": ids})
+        rows = cur.fetchall()
+    return {
+        r[0]: {"id": r[0], "nama": r[1], "kategori": r[2], "deskripsi": r[3], "harga": float(r[4]),
+               "url_gambar": r[5], "tersedia": r[6]}
+        for r in rows
+    }
+
+# Nilai menu.status_gambar
+IMAGE_READY = "siap"
+IMAGE_UPLOADING = "mengunggah"
+IMAGE_FAILED = "gagal"
+
+def is_upload_stale(started) -> bool:
+    """True jika unggahan yang dimulai pada `started` sudah melewati UPLOAD_STALE_MINUTES."""
+    return started is None or datetime.now(timezone.utc) - started > timedelta(minutes=UPLOAD_STALE_MINUTES)
+
+def image_status(item: Dict[str, Any]) -> str:
+    """Status gambar menu untuk ditampilkan; unggahan yang macet dilaporkan sebagai gagal."""
+    status = item.get("status_gambar") or IMAGE_READY
+    if status == IMAGE_UPLOADING and is_upload_stale(item.get("unggahan_mulai")):
+        return IMAGE_FAILED
+    return status
+
+def create_menu_item(name, category, description, price, image_url=None, image_variants=None, image_pending=None):
+    """`image_pending` adalah hash gambar yang sedang diunggah di latar (lihat upload_service.py)."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO menu (nama, kategori, deskripsi, harga, url_gambar, gambar_varian, status_gambar,
+                              unggahan_tertunda, unggahan_mulai)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s, CASE WHEN %s IS NULL THEN NULL ELSE NOW() END) RETURNING id
+            """,
+            (name, category, description, price, image_url, Json(image_variants) if image_variants else None,
+             IMAGE_UPLOADING if image_pending else IMAGE_READY, image_pending, image_pending),
+        )
+        mid = cur.fetchone()[0]
+        _bump_catalog_version(cur)
+        conn.commit()
+    menu_catalog.invalidate()
     return mid
 
-def update_menu_item(menu_id, name, category, description, price, image_url=None):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE menu SET nama=%s, kategori=%s, deskripsi=%s, harga=%s, url_gambar=%s WHERE id=%s",
-        (name, category, description, price, image_url, menu_id),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+def update_menu_item(menu_id, name, category, description, price, image_url=None, image_variants=None, image_pending=None):
+    """Kolom gambar hanya diubah jika `image_url` atau `image_pending` diberikan, agar penyimpanan
+    formulir tidak menimpa gambar yang selesai diunggah di latar sementara formulir terbuka."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE menu SET
+                nama = %(nama)s, kategori = %(kategori)s, deskripsi = %(deskripsi)s, harga = %(harga)s,
+                url_gambar = COALESCE(%(url)s, url_gambar),
+                gambar_varian = CASE WHEN %(url)s IS NULL THEN gambar_varian ELSE %(varian)s END,
+                status_gambar = CASE WHEN %(pending)s IS NULL THEN status_gambar ELSE %(uploading)s END,
+                unggahan_tertunda = COALESCE(%(pending)s, unggahan_tertunda),
+                unggahan_mulai = CASE WHEN %(pending)s IS NULL THEN unggahan_mulai ELSE NOW() END
+            WHERE id = %(id)s
+            """,
+            {
+                "nama": name, "kategori": category, "deskripsi": description, "harga": price,
+                "url": image_url, "varian": Json(image_variants) if image_variants else None,
+                "pending": image_pending, "uploading": IMAGE_UPLOADING, "id": menu_id,
+            },
+        )
+        _bump_catalog_version(cur)
+        conn.commit()
+    menu_catalog.invalidate()
+
+def _finish_menu_image(menu_id: int, digest: str, status: str, image_url=None, image_variants=None) -> bool:
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE menu SET
+                url_gambar = COALESCE(%(url)s, url_gambar),
+                gambar_varian = CASE WHEN %(url)s IS NULL THEN gambar_varian ELSE %(varian)s END,
+                status_gambar = %(status)s,
+                unggahan_tertunda = NULL,
+                unggahan_mulai = NULL
+            WHERE id = %(id)s AND unggahan_tertunda = %(digest)s
+            """,
+            {"url": image_url, "varian": Json(image_variants) if image_variants else None,
+             "status": status, "id": menu_id, "digest": digest},
+        )
+        updated = cur.rowcount > 0
+        if updated:
+            _bump_catalog_version(cur)
+        conn.commit()
+    if updated:
+        menu_catalog.invalidate()
+    return updated
+
+def complete_menu_image(menu_id: int, digest: str, image_url: str, image_variants: Dict[str, dict]) -> bool:
+    """Mengisi gambar hasil unggahan latar. Tidak melakukan apa pun (False) jika menu sudah dihapus
+    atau gambar lain diunggah setelahnya."""
+    return _finish_menu_image(menu_id, digest, IMAGE_READY, image_url, image_variants)
+
+def fail_menu_image(menu_id: int, digest: str) -> bool:
+    """Menandai unggahan gagal; gambar sebelumnya (jika ada) tetap dipakai."""
+    return _finish_menu_image(menu_id, digest, IMAGE_FAILED)
 
 def delete_menu_item(menu_id):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM menu WHERE id=%s", (menu_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM menu WHERE id=%s", (menu_id,))
+        _bump_catalog_version(cur)
+        conn.commit()
+    menu_catalog.invalidate()
+
+def list_menu_images_without_variants() -> List[Tuple[int, str]]:
+    """(id, url_gambar) untuk menu bergambar yang belum memiliki turunan gambar atau warna placeholder."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, url_gambar FROM menu
+            WHERE url_gambar IS NOT NULL AND (gambar_varian IS NULL OR NOT gambar_varian ? 'warna')
+            ORDER BY id
+            """
+        )
+        return cur.fetchall()
+
+def iter_menu_image_refs(batch_size: int = 500) -> Iterator[Tuple[str, Dict[str, dict], str]]:
+    """(url_gambar, gambar_varian, unggahan_tertunda) semua menu, dibaca per halaman berdasarkan id.
+    Unggahan yang sudah macet (lihat is_upload_stale) dilaporkan sebagai None."""
+    last_id = 0
+    while True:
+        with get_db_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, url_gambar, gambar_varian, unggahan_tertunda, unggahan_mulai FROM menu
+                WHERE id > %s ORDER BY id LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            rows = cur.fetchall()
+        for row in rows:
+            yield row[1], row[2], None if row[3] is None or is_upload_stale(row[4]) else row[3]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+def set_menu_image_variants(menu_id: int, image_url: str, image_variants: Dict[str, dict]) -> bool:
+    """Menyimpan turunan gambar hanya jika gambar menu belum diganti sejak turunan dibuat."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE menu SET gambar_varian = %s WHERE id = %s AND url_gambar = %s",
+            (Json(image_variants), menu_id, image_url),
+        )
+        updated = cur.rowcount > 0
+        if updated:
+            _bump_catalog_version(cur)
+        conn.commit()
+    if updated:
+        menu_catalog.invalidate()
+    return updated
 
 # -------------------- FUNGSI PROMO --------------------
 
 def get_active_promo(code: str):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, kode, jumlah_diskon, aktif FROM promo WHERE kode = %s AND aktif = TRUE", (code,))
-    r = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, kode, jumlah_diskon, aktif FROM promo WHERE kode = %s AND aktif = TRUE", (code,))
+        r = cur.fetchone()
     if not r:
         return None
     return {"id": r[0], "kode": r[1], "jumlah_diskon": float(r[2]), "aktif": r[3]}
 
 def list_promos():
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, kode, jumlah_diskon, aktif FROM promo ORDER BY id DESC")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, kode, jumlah_diskon, aktif FROM promo ORDER BY id DESC")
+        rows = cur.fetchall()
     return [{"id": r[0], "kode": r[1], "jumlah_diskon": float(r[2]), "aktif": r[3]} for r in rows]
 
 def create_promo(code, amount, active=True):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO promo (kode, jumlah_diskon, aktif) VALUES (%s,%s,%s) RETURNING id", (code, amount, active))
-    pid = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
-    return pid
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO promo (kode, jumlah_diskon, aktif) VALUES (%s,%s,%s) RETURNING id", (code, amount, active))
+        pid = cur.fetchone()[0]
+        conn.commit()
+        return pid
 
 def update_promo(pid, code, amount, active):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE promo SET kode=%s, jumlah_diskon=%s, aktif=%s WHERE id=%s", (code, amount, active, pid))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE promo SET kode=%s, jumlah_diskon=%s, aktif=%s WHERE id=%s", (code, amount, active, pid))
+        conn.commit()
 
 def delete_promo(pid):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM promo WHERE id=%s", (pid,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM promo WHERE id=%s", (pid,))
+        conn.commit()
 
 # -------------------- FUNGSI PESANAN --------------------
 
-def create_order(user_id, items: List[Dict], total_price, payment_method):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO pesanan (id_pengguna, item, total, metode_pembayaran) VALUES (%s,%s,%s,%s) RETURNING id",
-        (user_id, json.dumps(items), total_price, payment_method),
-    )
-    oid = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
-    return oid
-
-def list_orders():
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, id_pengguna, item, total, status, metode_pembayaran, dibuat_pada FROM pesanan ORDER BY dibuat_pada DESC")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [
+def _insert_order_items(cur, orders: Iterable[Tuple[int, List[Dict]]]):
+    """Menulis baris pesanan_item untuk pasangan (id pesanan, item) di dalam transaksi pemanggil,
+    semuanya dengan satu INSERT multi-baris."""
+    rows = [
+        (order_id, it.get('id_menu'), it.get('nama', ''), int(it.get('qty', 0)), it.get('harga', 0))
+        for order_id, items in orders
+        for it in items
+    ]
+    if rows:
+        execute_values(
+            cur,
+            "INSERT INTO pesanan_item (id_pesanan, id_menu, nama, qty, harga_satuan) VALUES %s",
+            rows,
+            page_size=len(rows),
+        )
+
+def allocate_order_ids(count: int) -> List[int]:
+    """Mengambil `count` id pesanan dari sequence. Id yang diketahui sebelum menulis memungkinkan
+    pemanggil memeriksa (existing_order_ids) apakah penulisan yang gagal sempat di-commit."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('pesanan', 'id')) FROM generate_series(1, %s)",
+            (count,),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        conn.commit()
+        return ids
+
+def create_orders(ids: List[int], orders: List[Tuple[int, List[Dict], Any, str]]):
+    """Menulis beberapa pesanan (id_pengguna, item, total, metode_pembayaran) dengan id dari
+    allocate_order_ids dalam satu transaksi; pesanan dan pesanan_item masing-masing satu INSERT."""
+    with get_db_conn() as conn, conn.cursor() as cur:
+        execute_values(
+            cur,
+            "INSERT INTO pesanan (id, id_pengguna, item, total, metode_pembayaran) VALUES %s",
+            [(oid, user_id, json.dumps(items), total, method)
+             for oid, (user_id, items, total, method) in zip(ids, orders)],
+            page_size=len(orders),
+        )
+        _insert_order_items(cur, [(oid, items) for oid, (_, items, _, _) in zip(ids, orders)])
+        conn.commit()
+
+def existing_order_ids(ids: List[int]) -> set:
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM pesanan WHERE id = ANY(%s)", (list(ids),))
+        return {r[0] for r in cur.fetchall()}
+
+# Kunci advisory lock agar backfill pesanan_item tidak berjalan ganda
+BACKFILL_ORDER_ITEMS_LOCK_KEY = 7_024_311
+
+def backfill_order_items(batch_size: int = 500) -> Iterator[Tuple[int, int]]:
+    """Mengisi pesanan_item dari kolom JSONB pesanan.item untuk pesanan lama.
+
+    Berjalan per batch id pesanan dengan commit di setiap batch, sehingga aman dijalankan
+    saat aplikasi melayani pelanggan. Menghasilkan (id pesanan terakhir, baris ditulis) per batch.
+    """
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (BACKFILL_ORDER_ITEMS_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            raise RuntimeError("Backfill pesanan_item sedang berjalan di proses lain")
+        conn.commit()
+        try:
+            last_id = 0
+            while True:
+                cur.execute(
+                    "SELECT MAX(id) FROM (SELECT id FROM pesanan WHERE id > %s ORDER BY id LIMIT %s) batch",
+                    (last_id, batch_size),
+                )
+                upper = cur.fetchone()[0]
+                if upper is None:
+                    break
+                cur.execute(
+                    """
+                    INSERT INTO pesanan_item (id_pesanan, id_menu, nama, qty, harga_satuan)
+                    SELECT p.id, m.id, COALESCE(e->>'nama', ''),
+                           COALESCE((e->>'qty')::INTEGER, 0), COALESCE((e->>'harga')::NUMERIC, 0)
+                    FROM pesanan p
+                    CROSS JOIN LATERAL jsonb_array_elements(COALESCE(p.item, '[]'::jsonb)) e
+                    LEFT JOIN menu m ON m.id = (e->>'id_menu')::INTEGER
+                    WHERE p.id > %s AND p.id <= %s
+                      AND NOT EXISTS (SELECT 1 FROM pesanan_item pi WHERE pi.id_pesanan = p.id)
+                    """,
+                    (last_id, upper),
+                )
+                written = cur.rowcount
+                conn.commit()
+                yield upper, written
+                last_id = upper
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s)", (BACKFILL_ORDER_ITEMS_LOCK_KEY,))
+            conn.commit()
+
+# Status pesanan, berurutan sesuai alur kerja
+ORDER_STATUSES = ("Tertunda", "Sedang Diproses", "Selesai", "Dibatalkan")
+# Pesanan yang masih perlu ditangani dapur/kasir
+OPEN_ORDER_STATUSES = ("Tertunda", "Sedang Diproses")
+
+# Filter opsional list_orders_page; orders_page_sql() menyusun kueri dari nama filter yang dipakai
+ORDERS_PAGE_FILTERS = {
+    "statuses": "status = ANY(%(statuses)s)",
+    "start": "dibuat_pada >= %(start)s",
+    "end": "dibuat_pada < %(end)s",
+    "cursor": "(dibuat_pada, id) < (%(cursor_time)s, %(cursor_id)s)",
+}
+
+ORDERS_PAGE_SQL = """
+    SELECT id, id_pengguna, item, total, status, metode_pembayaran, dibuat_pada
+    FROM pesanan {where}
+    ORDER BY dibuat_pada DESC, id DESC
+    LIMIT %(limit)s
+"""
+
+def orders_page_sql(*filters: str) -> str:
+    conditions = [ORDERS_PAGE_FILTERS[f] for f in filters]
+    return ORDERS_PAGE_SQL.format(where=("WHERE " + " AND ".join(conditions)) if conditions else "")
+
+def list_orders_page(statuses=OPEN_ORDER_STATUSES, start: date = None, end: date = None,
+                     cursor: Tuple[datetime, int] = None, limit: int = 20):
+    """Satu halaman pesanan, terbaru lebih dulu, dengan paginasi keyset pada (dibuat_pada, id).
+
+    `cursor` adalah (dibuat_pada, id) pesanan terakhir di halaman sebelumnya. `statuses=None` berarti semua status.
+    Mengembalikan (daftar pesanan, cursor halaman berikutnya atau None jika sudah habis).
+    """
+    filters = []
+    params = {"limit": limit + 1}
+    if statuses:
+        filters.append("statuses")
+        params["statuses"] = list(statuses)
+    if start:
+        filters.append("start")
+        params["start"] = start
+    if end:
+        filters.append("end")
+        params["end"] = end + timedelta(days=1)
+    if cursor:
+        filters.append("cursor")
+        params["cursor_time"], params["cursor_id"] = cursor
+
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(orders_page_sql(*filters), params)
+        rows = cur.fetchall()
+
+    orders = [
         {"id": r[0], "id_pengguna": r[1], "item": r[2], "total": float(r[3]), "status": r[4], "metode_pembayaran": r[5], "dibuat_pada": r[6]}
-        for r in rows
+        for r in rows[:limit]
     ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = orders[-1]
+        next_cursor = (last['dibuat_pada'], last['id'])
+    return orders, next_cursor
 
 def update_order_status(order_id, status):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE pesanan SET status=%s WHERE id=%s", (status, order_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT status FROM pesanan WHERE id=%s FOR UPDATE", (order_id,))
+        row = cur.fetchone()
+        if not row:
+            return
+        old_status = row[0]
+        cur.execute("UPDATE pesanan SET status=%s WHERE id=%s", (status, order_id))
+        # Jumlah terjual dan pendapatan hanya dihitung untuk pesanan yang Selesai
+        if (old_status == 'Selesai') != (status == 'Selesai'):
+            sign = 1 if status == 'Selesai' else -1
+            _bump_units_sold(cur, order_id, sign)
+            _bump_sales_rollup(cur, order_id, sign)
+        conn.commit()
+
+USER_ORDERS_SQL = "SELECT id, item, total, status, metode_pembayaran, dibuat_pada FROM pesanan WHERE id_pengguna = %(user_id)s ORDER BY dibuat_pada DESC"
 
 def get_user_orders(user_id):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, item, total, status, metode_pembayaran, dibuat_pada FROM pesanan WHERE id_pengguna = %s ORDER BY dibuat_pada DESC", (user_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(USER_ORDERS_SQL, {"user_id": user_id})
+        rows = cur.fetchall()
     return [
         {"id": r[0], "item": r[1], "total": float(r[2]), "status": r[3], "metode_pembayaran": r[4], "dibuat_pada": r[5]}
         for r in rows
     ]
 
 def get_order_by_id(order_id: int):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, item, total, status, metode_pembayaran, dibuat_pada FROM pesanan WHERE id = %s", (order_id,))
-    r = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, item, total, status, metode_pembayaran, dibuat_pada FROM pesanan WHERE id = %s", (order_id,))
+        r = cur.fetchone()
     if not r:
         return None
     return {"id": r[0], "item": r[1], "total": float(r[2]), "status": r[3], "metode_pembayaran": r[4], "dibuat_pada": r[5]}
@@ -472,32 +914,28 @@ def get_order_by_id(order_id: int):
 # -------------------- FUNGSI ULASAN --------------------
 
 def submit_review(user_id, menu_id, rating, text):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO ulasan (id_pengguna, id_menu, rating, teks_ulasan) VALUES (%s,%s,%s,%s)", (user_id, menu_id, rating, text))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO ulasan (id_pengguna, id_menu, rating, teks_ulasan) VALUES (%s,%s,%s,%s)", (user_id, menu_id, rating, text))
+        _bump_menu_stats(cur, menu_id, ulasan=1, rating=rating)
+        conn.commit()
+
+MENU_REVIEWS_SQL = "SELECT u.id, u.id_pengguna, p.nama_pengguna, u.rating, u.teks_ulasan, u.dibuat_pada FROM ulasan u LEFT JOIN pengguna p ON u.id_pengguna = p.id WHERE u.id_menu = %(menu_id)s ORDER BY u.dibuat_pada DESC"
 
 def get_reviews_for_menu(menu_id):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT u.id, u.id_pengguna, p.nama_pengguna, u.rating, u.teks_ulasan, u.dibuat_pada FROM ulasan u LEFT JOIN pengguna p ON u.id_pengguna = p.id WHERE u.id_menu = %s ORDER BY u.dibuat_pada DESC", (menu_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(MENU_REVIEWS_SQL, {"menu_id": menu_id})
+        rows = cur.fetchall()
     return [
         {"id": r[0], "id_pengguna": r[1], "nama_pengguna": r[2], "penilaian": r[3], "teks_ulasan": r[4], "dibuat_pada": r[5]}
         for r in rows
     ]
 
+ALL_REVIEWS_SQL = "SELECT u.id, u.id_pengguna, p.nama_pengguna, u.id_menu, m.nama, u.rating, u.teks_ulasan, u.dibuat_pada FROM ulasan u LEFT JOIN pengguna p ON u.id_pengguna = p.id LEFT JOIN menu m ON u.id_menu = m.id ORDER BY u.dibuat_pada DESC"
+
 def get_all_reviews():
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT u.id, u.id_pengguna, p.nama_pengguna, u.id_menu, m.nama, u.rating, u.teks_ulasan, u.dibuat_pada FROM ulasan u LEFT JOIN pengguna p ON u.id_pengguna = p.id LEFT JOIN menu m ON u.id_menu = m.id ORDER BY u.dibuat_pada DESC")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute(ALL_REVIEWS_SQL)
+        rows = cur.fetchall()
     return [
         {"id": r[0], "id_pengguna": r[1], "nama_pengguna": r[2], "id_menu": r[3], "nama_menu": r[4], "penilaian": r[5], "teks_ulasan": r[6], "dibuat_pada": r[7]}
         for r in rows
@@ -0,0 +1,170 @@
+"""
+Pool koneksi PostgreSQL untuk aplikasi Caffe Dehh
+Menyimpan koneksi yang sudah terbuka agar setiap kueri tidak perlu handshake TCP/TLS baru.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    """Tidak ada koneksi kosong dalam batas waktu checkout."""
+
+
+class ConnectionPool:
+    """Pool koneksi berukuran terbatas yang aman dipakai banyak thread.
+
+    Koneksi dipinjam dengan `getconn()` dan wajib dikembalikan dengan `putconn()`.
+    Jika semua koneksi sedang dipakai, peminjam menunggu paling lama `timeout` detik.
+    Koneksi yang menganggur terlalu lama diperiksa dulu sebelum diberikan.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_idle: float, **dsn):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError("Ukuran pool tidak valid")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self._dsn = dsn
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Tumpukan (LIFO) koneksi menganggur: (koneksi, waktu terakhir dipakai, pernah dikembalikan)
+        self._idle: List[Tuple[Any, float, bool]] = []
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "checkout": 0,
+            "handshake": 0,
+            "handshake_dihindari": 0,
+            "timeout": 0,
+            "dibuang": 0,
+            "total_tunggu": 0.0,
+            "tunggu_maks": 0.0,
+        }
+        # Koneksi awal belum pernah dipakai, sehingga checkout pertamanya bukan handshake yang dihindari
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic(), False))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._dsn)
+        with self._lock:
+            self._stats["handshake"] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._stats["dibuang"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        """Meminjam koneksi; memunculkan `PoolTimeout` jika pool penuh terlalu lama."""
+        if self._closed:
+            raise PoolError("Pool koneksi sudah ditutup")
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeout"] += 1
+            raise PoolTimeout(f"Tidak ada koneksi database kosong dalam {self.timeout:g} detik")
+        waited = time.monotonic() - started
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    conn = self._connect()
+                elif self._is_healthy(candidate[0], candidate[1]):
+                    conn = candidate[0]
+                    if candidate[2]:
+                        with self._lock:
+                            self._stats["handshake_dihindari"] += 1
+                else:
+                    self._discard(candidate[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkout"] += 1
+            self._stats["total_tunggu"] += waited
+            self._stats["tunggu_maks"] = max(self._stats["tunggu_maks"], waited)
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Mengembalikan koneksi ke pool. Transaksi yang masih terbuka di-rollback."""
+        try:
+            if not discard and not conn.closed:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        discard = True
+
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic(), True))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        """Menutup semua koneksi menganggur dan menolak peminjaman berikutnya."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Ringkasan pemakaian pool untuk menentukan ukuran yang tepat saat jam sibuk."""
+        with self._lock:
+            s = dict(self._stats)
+            in_use = self._in_use
+            idle = len(self._idle)
+        checkout = s["checkout"]
+        return {
+            "ukuran_maks": self.maxconn,
+            "dipakai": in_use,
+            "menganggur": idle,
+            "checkout": checkout,
+            "handshake": s["handshake"],
+            "handshake_dihindari": s["handshake_dihindari"],
+            "timeout": s["timeout"],
+            "dibuang": s["dibuang"],
+            "rata_rata_tunggu_ms": (s["total_tunggu"] / checkout * 1000) if checkout else 0.0,
+            "tunggu_maks_ms": s["tunggu_maks"] * 1000,
+        }
@@ -0,0 +1,129 @@
+"""
+Pengolahan gambar menu untuk aplikasi Caffe Dehh
+Membuat turunan gambar (thumbnail, kartu, detail) dalam format WebP dengan cadangan JPEG.
+"""
+
+import io
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Lebar maksimum (px) setiap varian; gambar yang lebih kecil tidak diperbesar
+VARIANT_WIDTHS = {
+    "thumb": 160,   # daftar admin, halaman favorit
+    "card": 480,    # kartu menu (200px tinggi, 2x untuk layar retina)
+    "detail": 1080,
+}
+
+# format -> (format Pillow, content type, opsi simpan)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Batas piksel gambar masukan (mis. 50 MP) untuk menolak berkas yang tidak wajar
+MAX_PIXELS = 50_000_000
+
+
+class Derivative(NamedTuple):
+    varian: str
+    format: str
+    lebar: int
+    tinggi: int
+    content_type: str
+    data: bytes
+
+
+def _open_header(file_bytes: bytes) -> Image.Image:
+    """Membaca header gambar saja dan menolak gambar di atas MAX_PIXELS sebelum piksel didekode."""
+    try:
+        img = Image.open(io.BytesIO(file_bytes))
+    except Image.DecompressionBombError as e:
+        raise ValueError("Gambar terlalu besar.") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Berkas bukan gambar yang valid: {e}") from e
+    if img.width * img.height > MAX_PIXELS:
+        raise ValueError("Gambar terlalu besar.")
+    return img
+
+
+def _open(file_bytes: bytes) -> Image.Image:
+    img = _open_header(file_bytes)
+    try:
+        img.load()
+    except Image.DecompressionBombError as e:
+        raise ValueError("Gambar terlalu besar.") from e
+    except OSError as e:
+        raise ValueError(f"Berkas bukan gambar yang valid: {e}") from e
+    # Foto ponsel sering disimpan miring dengan tag orientasi EXIF
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        # JPEG tidak mendukung transparansi; latar putih sesuai tampilan kartu
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def _fit(width: int, height: int, max_width: int) -> Tuple[int, int]:
+    if width <= max_width:
+        return width, height
+    return max_width, max(1, round(height * max_width / width))
+
+
+def variant_sizes(file_bytes: bytes) -> Dict[str, Tuple[int, int]]:
+    """Ukuran (lebar, tinggi) setiap varian tanpa mendekode piksel; hanya header gambar yang dibaca."""
+    img = _open_header(file_bytes)
+    width, height = img.size
+    # Orientasi EXIF 5-8 berarti gambar diputar 90 derajat (lihat ImageOps.exif_transpose)
+    if img.getexif().get(0x0112) in (5, 6, 7, 8):
+        width, height = height, width
+    return {varian: _fit(width, height, max_width) for varian, max_width in VARIANT_WIDTHS.items()}
+
+
+def is_valid_image(file_bytes: bytes) -> bool:
+    """Pemeriksaan cepat (header saja) sebelum gambar diterima untuk diunggah."""
+    try:
+        variant_sizes(file_bytes)
+        return True
+    except ValueError:
+        return False
+
+
+def make_derivatives(file_bytes: bytes) -> List[Derivative]:
+    """Membuat semua varian x format dari gambar asli. Melempar ValueError jika berkas bukan gambar."""
+    img = _open(file_bytes)
+    derivatives = []
+    for varian, max_width in VARIANT_WIDTHS.items():
+        size = _fit(img.width, img.height, max_width)
+        resized = img.resize(size, Image.LANCZOS) if size != img.size else img
+        for fmt, (pil_format, content_type, options) in FORMATS.items():
+            buf = io.BytesIO()
+            resized.save(buf, pil_format, **options)
+            derivatives.append(Derivative(varian, fmt, resized.width, resized.height, content_type, buf.getvalue()))
+    return derivatives
+
+
+def placeholder_color(file_bytes: bytes) -> str:
+    """Warna dominan gambar (#rrggbb), ditampilkan sebagai latar kartu selama gambar dimuat."""
+    img = Image.open(io.BytesIO(file_bytes))
+    # JPEG dapat didekode langsung pada resolusi rendah sehingga jauh lebih cepat
+    img.draft("RGB", (64, 64))
+    small = img.convert("RGB").resize((32, 32), Image.BILINEAR)
+    palette = small.quantize(colors=4)
+    _, index = max(palette.getcolors())
+    r, g, b = palette.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def variants_manifest(sizes: Dict[str, Tuple[int, int]], url_for: Callable[[str, str], str], color: str) -> dict:
+    """Menyusun nilai kolom menu.gambar_varian:
+    {"warna": "#a0522d", "card": {"lebar": 480, "tinggi": 360, "webp": url, "jpg": url}, ...}.
+    `url_for(varian, format)` mengembalikan URL publik turunan tersebut."""
+    manifest: dict = {"warna": color}
+    for varian, (width, height) in sizes.items():
+        manifest[varian] = {"lebar": width, "tinggi": height}
+        for fmt in FORMATS:
+            manifest[varian][fmt] = url_for(varian, fmt)
+    return manifest
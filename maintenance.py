@@ -0,0 +1,418 @@
+"""
+Perintah pemeliharaan untuk aplikasi Caffe Dehh
+Dijalankan dari terminal, contoh: `python maintenance.py backfill-pesanan-item --batch 500`
+"""
+
+import argparse
+import os
+import re
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import assets
+import database
+import images
+import storage
+import migrations
+
+# -------------------- SKEMA --------------------
+
+
+def cmd_migrate(args):
+    version = migrations.migrate()
+    print(f"Skema database pada versi {version}.")
+
+
+# -------------------- BACKFILL & STATISTIK --------------------
+
+
+def cmd_backfill_order_items(args):
+    total = 0
+    for last_id, written in database.backfill_order_items(batch_size=args.batch):
+        total += written
+        print(f"s/d pesanan #{last_id}: {written} baris ditulis")
+    print(f"Selesai. Total {total} baris pesanan_item ditulis.")
+
+
+def cmd_rebuild_stats(args):
+    database.rebuild_menu_stats()
+    database.rebuild_sales_rollup()
+    print("menu_stats dan penjualan_per_jam dihitung ulang.")
+
+
+# -------------------- GAMBAR --------------------
+
+
+def _backfill_image(menu_id: int, url: str) -> str:
+    path = storage.storage_path_from_url(url)
+    if not path:
+        return "dilewati (bukan URL bucket)"
+    variants = storage.upload_derivatives(storage.download_image(path))
+    if not database.set_menu_image_variants(menu_id, url, variants):
+        return "dilewati (gambar sudah diganti)"
+    return "selesai"
+
+
+def cmd_backfill_images(args):
+    """Membuat turunan gambar untuk menu lama. Setiap gambar diunduh, diolah dan diunggah di
+    thread terpisah; pekerjaan didominasi I/O jaringan sehingga thread cukup."""
+    pending = database.list_menu_images_without_variants()
+    print(f"{len(pending)} gambar menu belum memiliki turunan (atau warna placeholder).")
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(_backfill_image, mid, url): mid for mid, url in pending}
+        for future in as_completed(futures):
+            mid = futures[future]
+            try:
+                print(f"menu #{mid}: {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"menu #{mid}: GAGAL - {e}")
+    print(f"Selesai. {len(pending) - failed} berhasil/dilewati, {failed} gagal.")
+
+
+def _referenced_images():
+    """Path objek yang dirujuk tabel menu, folder turunan (<hash>/) yang dipakai, dan hash unggahan
+    yang sedang berjalan (objeknya mungkin sudah ada sebelum baris menu diperbarui). Unggahan yang
+    macet melewati UPLOAD_STALE_MINUTES tidak dihitung, sehingga sisa objeknya ikut dibersihkan."""
+    paths, folders, pending = set(), set(), set()
+    for url, variants, pending_digest in database.iter_menu_image_refs():
+        urls = [url] + [
+            (variants or {}).get(varian, {}).get(fmt)
+            for varian in images.VARIANT_WIDTHS for fmt in images.FORMATS
+        ]
+        for u in urls:
+            path = storage.storage_path_from_url(u) if u else None
+            if path:
+                paths.add(path)
+                if "/" in path:
+                    folders.add(path.split("/", 1)[0])
+        if pending_digest:
+            pending.add(pending_digest)
+    return paths, folders, pending
+
+
+def _is_referenced(path: str, refs) -> bool:
+    paths, folders, pending = refs
+    stem = path.split("/", 1)[0].split(".", 1)[0]
+    if "/" in path:
+        return path.split("/", 1)[0] in folders or stem in pending
+    return path in paths or stem in pending
+
+
+def _created_before(entry: dict, cutoff: datetime) -> bool:
+    stamp = entry.get("created_at") or entry.get("updated_at")
+    if not stamp:
+        return False
+    return datetime.fromisoformat(stamp.replace("Z", "+00:00")) < cutoff
+
+
+def cmd_sweep_images(args):
+    """Menghapus objek bucket yang tidak lagi dirujuk menu mana pun. Objek tidak dihapus saat menu
+    diubah/dihapus karena nama berbasis hash bisa dipakai bersama oleh beberapa menu."""
+    refs = paths, folders, pending = _referenced_images()
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=args.grace_hours)
+    print(f"{len(paths)} objek dirujuk oleh tabel menu, {len(pending)} unggahan sedang berjalan.")
+
+    report = {"diperiksa": 0, "dipakai": 0, "terlalu_baru": 0}
+    orphans = []
+    orphan_bytes = 0
+    for entry in storage.list_objects(page_size=args.page):
+        name = entry["name"]
+        if entry.get("id") is None:
+            # Folder turunan; seluruh isinya dipakai atau tidak sama sekali
+            if name in folders or name in pending:
+                report["dipakai"] += 1
+                continue
+            candidates = [
+                (f"{name}/{child['name']}", child)
+                for child in storage.list_objects(name, page_size=args.page) if child.get("id")
+            ]
+        else:
+            candidates = [(name, entry)]
+
+        for path, obj in candidates:
+            report["diperiksa"] += 1
+            if _is_referenced(path, refs):
+                report["dipakai"] += 1
+            elif not _created_before(obj, cutoff):
+                report["terlalu_baru"] += 1
+            else:
+                orphans.append(path)
+                orphan_bytes += (obj.get("metadata") or {}).get("size") or 0
+
+    print(
+        f"Diperiksa: {report['diperiksa']} | dipakai: {report['dipakai']} | "
+        f"lebih baru dari {args.grace_hours} jam: {report['terlalu_baru']} | "
+        f"yatim: {len(orphans)} ({orphan_bytes / 1024 / 1024:.1f} MB)"
+    )
+    if args.laporan:
+        with open(args.laporan, "w", encoding="utf-8") as f:
+            f.write("\n".join(orphans))
+        print(f"Daftar objek yatim ditulis ke {args.laporan}")
+
+    if args.dry_run:
+        for path in orphans[:20]:
+            print(f"  akan dihapus: {path}")
+        if len(orphans) > 20:
+            print(f"  ... dan {len(orphans) - 20} lainnya")
+        print("Mode uji coba: tidak ada yang dihapus.")
+        return
+
+    removed = failed = rescued = 0
+    for i in range(0, len(orphans), args.batch):
+        # Rujukan dibaca ulang tepat sebelum setiap penghapusan: unggahan yang isinya sama dengan objek
+        # lama (dedup di storage.upload_menu_image) bisa mulai merujuknya lagi setelah daftar dibuat
+        refs = _referenced_images()
+        candidates = orphans[i:i + args.batch]
+        batch = [path for path in candidates if not _is_referenced(path, refs)]
+        rescued += len(candidates) - len(batch)
+        if not batch:
+            continue
+        try:
+            storage.remove_objects(batch)
+            removed += len(batch)
+        except Exception as e:
+            failed += len(batch)
+            print(f"Gagal menghapus {len(batch)} objek mulai {batch[0]}: {e}")
+    print(f"Selesai. {removed} objek dihapus, {failed} gagal, {rescued} batal dihapus karena dirujuk lagi.")
+
+
+# -------------------- ASET STATIS --------------------
+
+# Google Fonts memilih format berdasarkan User-Agent; browser modern mendapat WOFF2
+_FONT_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+def _download(url: str, dest: str):
+    request = urllib.request.Request(url, headers={"User-Agent": _FONT_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as resp:
+        data = resp.read()
+    path = os.path.join(assets.STATIC_DIR, dest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    print(f"{dest}: {len(data) / 1024:.0f} KB")
+
+
+def cmd_fetch_assets(args):
+    """Mengunduh font (subset latin) dan logo ke static/ agar halaman tidak bergantung pada host
+    pihak ketiga. Cukup dijalankan sekali saat deploy atau ketika sumbernya berubah."""
+    request = urllib.request.Request(assets.FONT_CSS_URL, headers={"User-Agent": _FONT_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as resp:
+        font_css = resp.read().decode("utf-8")
+    # Font variabel: satu berkas per keluarga mencakup semua ketebalan; ambil blok subset latin
+    for family, dest in assets.FONT_FILES.items():
+        match = re.search(
+            r"/\* latin \*/\s*@font-face\s*{[^}]*font-family: '" + re.escape(family) + r"'[^}]*url\((\S+?\.woff2)\)",
+            font_css,
+        )
+        if not match:
+            raise SystemExit(f"Font {family} tidak ditemukan di {assets.FONT_CSS_URL}")
+        _download(match.group(1), dest)
+    _download(assets.LOGO_URL, assets.LOGO_FILE)
+
+
+# -------------------- DATA UJI --------------------
+
+SEED_SQL = [
+    """
+    INSERT INTO pengguna (nama_pengguna, kata_sandi, peran)
+    SELECT 'seed_user_' || g, md5(g::TEXT), 'user' FROM generate_series(1, %(pengguna)s) g
+    ON CONFLICT (nama_pengguna) DO NOTHING
+    """,
+    """
+    INSERT INTO menu (nama, kategori, deskripsi, harga, tersedia)
+    SELECT 'Seed Menu ' || g,
+           (ARRAY['Makanan', 'Minuman', 'Dessert'])[1 + g %% 3],
+           'Deskripsi menu uji nomor ' || g,
+           5000 + (g %% 20) * 1000,
+           g %% 10 <> 0
+    FROM generate_series(1, %(menu)s) g
+    """,
+    """
+    WITH u AS (SELECT array_agg(id) AS ids FROM pengguna WHERE nama_pengguna LIKE 'seed\\_user\\_%%'),
+         mn AS (SELECT array_agg(id ORDER BY id) AS ids, array_agg(nama ORDER BY id) AS nama,
+                       array_agg(harga ORDER BY id) AS harga
+                FROM menu WHERE nama LIKE 'Seed Menu %%')
+    INSERT INTO pesanan (id_pengguna, item, total, status, metode_pembayaran, dibuat_pada)
+    SELECT u.ids[r.ku], jsonb_build_array(jsonb_build_object(
+               'id_menu', mn.ids[r.km], 'nama', mn.nama[r.km], 'harga', mn.harga[r.km], 'qty', r.qty)),
+           mn.harga[r.km] * r.qty,
+           (ARRAY['Tertunda', 'Sedang Diproses', 'Selesai', 'Selesai', 'Selesai', 'Dibatalkan'])[r.ks],
+           (ARRAY['Tunai', 'QRIS', 'E-Wallet'])[1 + g %% 3],
+           NOW() - r.umur
+    FROM generate_series(1, %(pesanan)s) g, u, mn,
+         LATERAL (SELECT 1 + floor(random() * array_length(u.ids, 1) + g * 0)::INT AS ku,
+                         1 + floor(random() * array_length(mn.ids, 1) + g * 0)::INT AS km,
+                         1 + floor(random() * 3 + g * 0)::INT AS qty,
+                         1 + floor(random() * 6 + g * 0)::INT AS ks,
+                         random() * INTERVAL '365 days' + g * INTERVAL '0 s' AS umur) r
+    """,
+    """
+    WITH u AS (SELECT array_agg(id) AS ids FROM pengguna WHERE nama_pengguna LIKE 'seed\\_user\\_%%'),
+         mn AS (SELECT array_agg(id) AS ids FROM menu WHERE nama LIKE 'Seed Menu %%')
+    INSERT INTO ulasan (id_pengguna, id_menu, rating, teks_ulasan, dibuat_pada)
+    SELECT u.ids[1 + floor(random() * array_length(u.ids, 1) + g * 0)::INT],
+           mn.ids[1 + floor(random() * array_length(mn.ids, 1) + g * 0)::INT],
+           1 + floor(random() * 5 + g * 0)::INT,
+           'Ulasan uji ' || g,
+           NOW() - random() * INTERVAL '365 days'
+    FROM generate_series(1, %(ulasan)s) g, u, mn
+    """,
+    """
+    WITH u AS (SELECT array_agg(id) AS ids FROM pengguna WHERE nama_pengguna LIKE 'seed\\_user\\_%%'),
+         mn AS (SELECT array_agg(id) AS ids FROM menu WHERE nama LIKE 'Seed Menu %%')
+    INSERT INTO menu_favorit (id_pengguna, id_menu)
+    SELECT u.ids[1 + floor(random() * array_length(u.ids, 1) + g * 0)::INT],
+           mn.ids[1 + floor(random() * array_length(mn.ids, 1) + g * 0)::INT]
+    FROM generate_series(1, %(favorit)s) g, u, mn
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+
+def cmd_seed(args):
+    if not args.yakin:
+        raise SystemExit("Perintah ini menulis data uji ke database di konfigurasi. Tambahkan --yakin untuk melanjutkan.")
+    params = {
+        "pengguna": args.pengguna, "menu": args.menu, "pesanan": args.pesanan,
+        "ulasan": args.ulasan, "favorit": args.favorit,
+    }
+    with database.get_db_conn() as conn, conn.cursor() as cur:
+        for statement in SEED_SQL:
+            cur.execute(statement, params)
+            print(f"{cur.rowcount} baris ditulis")
+        conn.commit()
+    for _ in database.backfill_order_items():
+        pass
+    database.rebuild_menu_stats()
+    database.rebuild_sales_rollup()
+    with database.get_db_conn() as conn, conn.cursor() as cur:
+        cur.execute("ANALYZE")
+        conn.commit()
+    print("Data uji selesai dibuat.")
+
+
+# -------------------- RENCANA KUERI --------------------
+# Kueri utama diambil langsung dari konstanta di database.py, jadi rencana selalu sesuai kode yang berjalan
+
+EXPLAIN_QUERIES = [
+    ("muat katalog menu (cache)", database.MENU_CATALOG_SQL),
+    ("get_user_favorite_ids", database.FAVORITE_IDS_SQL),
+    ("search_menu_ids", database.SEARCH_MENU_SQL),
+    ("get_menu_items", database.MENU_ITEMS_SQL),
+    ("get_sales_rollup", database.SALES_ROLLUP_SQL),
+    ("get_top_selling_items", database.TOP_SELLING_SQL),
+    ("list_orders_page (pesanan terbuka)", database.orders_page_sql("statuses")),
+    ("list_orders_page (semua, halaman berikutnya)", database.orders_page_sql("cursor")),
+    ("get_user_orders", database.USER_ORDERS_SQL),
+    ("get_reviews_for_menu", database.MENU_REVIEWS_SQL),
+    ("get_all_reviews", database.ALL_REVIEWS_SQL),
+    ("authenticate", database.AUTHENTICATE_SQL),
+]
+
+_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+_INDEX_USED = re.compile(r"Index(?: Only)? Scan(?: Backward)? using (\w+)|Bitmap Index Scan on (\w+)")
+
+
+def _explain_params(cur):
+    cur.execute("SELECT id FROM pengguna ORDER BY random() LIMIT 1")
+    user = cur.fetchone()
+    cur.execute("SELECT id FROM menu ORDER BY random() LIMIT 20")
+    menu_ids = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT nama_pengguna FROM pengguna ORDER BY random() LIMIT 1")
+    username = cur.fetchone()
+    now = datetime.now(timezone.utc)
+    return {
+        "user_id": user[0] if user else 0,
+        "menu_id": menu_ids[0] if menu_ids else 0,
+        "menu_ids": menu_ids,
+        "statuses": list(database.OPEN_ORDER_STATUSES),
+        "cursor_time": now - timedelta(days=30),
+        "cursor_id": 2147483647,
+        "granularity": "day",
+        "start": now - timedelta(days=365),
+        "end": now,
+        "terms": ["kopi", "es"],
+        "limit": 50,
+        "username": username[0] if username else "",
+    }
+
+
+def cmd_explain(args):
+    lines = []
+    with database.get_db_conn() as conn, conn.cursor() as cur:
+        params = _explain_params(cur)
+        for name, sql in EXPLAIN_QUERIES:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+            plan = "\n".join(r[0] for r in cur.fetchall())
+            indexes = sorted({a or b for a, b in _INDEX_USED.findall(plan)})
+            seq_scans = sorted(set(_SEQ_SCAN.findall(plan)))
+            lines.append(f"=== {name} ===")
+            lines.append(f"Indeks dipakai: {', '.join(indexes) or '-'} | Seq Scan: {', '.join(seq_scans) or '-'}")
+            lines.append(plan)
+            lines.append("")
+        # EXPLAIN ANALYZE benar-benar menjalankan kueri; jangan simpan efek apa pun
+        conn.rollback()
+
+    output = "\n".join(lines)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Rencana kueri ditulis ke {args.out}")
+    else:
+        print(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perintah pemeliharaan Caffe Dehh")
+    sub = parser.add_subparsers(dest="perintah", required=True)
+
+    p = sub.add_parser("migrate", help="Terapkan migrasi skema yang tertunda (jalankan saat deploy)")
+    p.set_defaults(func=cmd_migrate, cek_skema=False)
+
+    p = sub.add_parser("backfill-pesanan-item", help="Isi pesanan_item dari JSONB pesanan lama")
+    p.add_argument("--batch", type=int, default=500, help="Jumlah pesanan per transaksi")
+    p.set_defaults(func=cmd_backfill_order_items)
+
+    p = sub.add_parser("rebuild-stats", help="Hitung ulang menu_stats dan penjualan_per_jam")
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = sub.add_parser("backfill-images", help="Buat turunan (thumbnail/WebP) untuk gambar menu lama")
+    p.add_argument("--workers", type=int, default=8, help="Jumlah gambar yang diproses bersamaan")
+    p.set_defaults(func=cmd_backfill_images)
+
+    p = sub.add_parser("sweep-images", help="Hapus gambar di bucket yang tidak dirujuk menu mana pun")
+    p.add_argument("--dry-run", action="store_true", help="Hanya laporkan, jangan hapus")
+    p.add_argument("--grace-hours", type=float, default=24, help="Lewati objek yang lebih baru dari ini")
+    p.add_argument("--batch", type=int, default=100, help="Jumlah objek per permintaan remove()")
+    p.add_argument("--page", type=int, default=1000, help="Jumlah entri per halaman listing bucket")
+    p.add_argument("--laporan", help="Tulis daftar objek yatim ke berkas")
+    p.set_defaults(func=cmd_sweep_images)
+
+    p = sub.add_parser("fetch-assets", help="Unduh font dan logo ke folder static/ (sekali saat deploy)")
+    p.set_defaults(func=cmd_fetch_assets, cek_skema=False)
+
+    p = sub.add_parser("seed", help="Isi database (non-produksi) dengan data uji dalam jumlah besar")
+    p.add_argument("--pengguna", type=int, default=2000)
+    p.add_argument("--menu", type=int, default=200)
+    p.add_argument("--pesanan", type=int, default=200000)
+    p.add_argument("--ulasan", type=int, default=50000)
+    p.add_argument("--favorit", type=int, default=20000)
+    p.add_argument("--yakin", action="store_true", help="Konfirmasi menulis ke database di konfigurasi")
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser("explain", help="Tampilkan EXPLAIN (ANALYZE, BUFFERS) untuk kueri utama")
+    p.add_argument("--out", help="Tulis hasil ke berkas alih-alih ke layar")
+    p.set_defaults(func=cmd_explain)
+
+    args = parser.parse_args()
+    if getattr(args, "cek_skema", True) and migrations.schema_version() < migrations.LATEST_VERSION:
+        raise SystemExit("Skema database belum terbaru; jalankan `python maintenance.py migrate` dulu")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""
+Migrasi skema database untuk aplikasi Caffe Dehh
+Setiap migrasi bernomor dijalankan tepat sekali dan dicatat di tabel schema_version.
+"""
+
+import re
+import threading
+import time
+from typing import List, NamedTuple, Sequence, Union
+
+import streamlit as st
+from database import get_db_conn
+
+# Kunci advisory lock agar beberapa proses tidak menjalankan migrasi bersamaan
+MIGRATION_LOCK_KEY = 7_024_310
+
+# Batas waktu menunggu lock tabel; DDL yang mengantre terlalu lama akan memblokir semua pembaca
+DDL_LOCK_TIMEOUT = "5s"
+
+# Jeda antar percobaan mengambil advisory lock migrasi
+LOCK_POLL_INTERVAL = 0.5
+
+# Selang minimal antar pemeriksaan versi skema di aplikasi selama skema belum siap
+SCHEMA_RECHECK_SECONDS = 10
+
+
+class Migration(NamedTuple):
+    versi: int
+    nama: str
+    # Satu string SQL, atau daftar perintah yang dijalankan satu per satu
+    sql: Union[str, Sequence[str]]
+    # False untuk perintah yang tidak boleh di dalam transaksi, mis. CREATE INDEX CONCURRENTLY
+    transaksional: bool = True
+
+
+# -------------------- DAFTAR MIGRASI --------------------
+# Tambahkan migrasi baru di akhir dengan nomor versi berikutnya. Jangan ubah migrasi yang sudah dirilis.
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "skema awal", """
+        CREATE TABLE IF NOT EXISTS pengguna (
+            id SERIAL PRIMARY KEY,
+            nama_pengguna TEXT UNIQUE NOT NULL,
+            kata_sandi TEXT NOT NULL,
+            peran TEXT NOT NULL DEFAULT 'user'
+        );
+        CREATE TABLE IF NOT EXISTS menu (
+            id SERIAL PRIMARY KEY,
+            nama TEXT NOT NULL,
+            kategori TEXT NOT NULL,
+            deskripsi TEXT,
+            harga NUMERIC NOT NULL,
+            url_gambar TEXT,
+            tersedia BOOLEAN DEFAULT TRUE
+        );
+        CREATE TABLE IF NOT EXISTS promo (
+            id SERIAL PRIMARY KEY,
+            kode TEXT UNIQUE NOT NULL,
+            jumlah_diskon NUMERIC NOT NULL,
+            aktif BOOLEAN DEFAULT TRUE
+        );
+        CREATE TABLE IF NOT EXISTS pesanan (
+            id SERIAL PRIMARY KEY,
+            id_pengguna INTEGER REFERENCES pengguna(id),
+            item JSONB,
+            total NUMERIC,
+            status TEXT DEFAULT 'Tertunda',
+            metode_pembayaran TEXT,
+            dibuat_pada TIMESTAMP DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS ulasan (
+            id SERIAL PRIMARY KEY,
+            id_pengguna INTEGER REFERENCES pengguna(id),
+            id_menu INTEGER REFERENCES menu(id),
+            rating INTEGER CHECK (rating >= 1 AND rating <= 5),
+            teks_ulasan TEXT,
+            dibuat_pada TIMESTAMP DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS menu_favorit (
+            id SERIAL PRIMARY KEY,
+            id_pengguna INTEGER REFERENCES pengguna(id),
+            id_menu INTEGER REFERENCES menu(id),
+            UNIQUE(id_pengguna, id_menu)
+        );
+    """),
+    Migration(2, "tabel menu_stats", """
+        CREATE TABLE IF NOT EXISTS menu_stats (
+            id_menu INTEGER PRIMARY KEY REFERENCES menu(id) ON DELETE CASCADE,
+            jumlah_ulasan INTEGER NOT NULL DEFAULT 0,
+            total_rating INTEGER NOT NULL DEFAULT 0,
+            rating_1 INTEGER NOT NULL DEFAULT 0,
+            rating_2 INTEGER NOT NULL DEFAULT 0,
+            rating_3 INTEGER NOT NULL DEFAULT 0,
+            rating_4 INTEGER NOT NULL DEFAULT 0,
+            rating_5 INTEGER NOT NULL DEFAULT 0,
+            rating_rata_rata NUMERIC GENERATED ALWAYS AS (
+                CASE WHEN jumlah_ulasan > 0 THEN total_rating::NUMERIC / jumlah_ulasan ELSE 0 END
+            ) STORED,
+            jumlah_favorit INTEGER NOT NULL DEFAULT 0,
+            jumlah_terjual INTEGER NOT NULL DEFAULT 0,
+            diperbarui_pada TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        INSERT INTO menu_stats (
+            id_menu, jumlah_ulasan, total_rating,
+            rating_1, rating_2, rating_3, rating_4, rating_5,
+            jumlah_favorit, jumlah_terjual
+        )
+        SELECT
+            m.id, COALESCE(u.jumlah, 0), COALESCE(u.total, 0),
+            COALESCE(u.r1, 0), COALESCE(u.r2, 0), COALESCE(u.r3, 0), COALESCE(u.r4, 0), COALESCE(u.r5, 0),
+            COALESCE(f.jumlah, 0), COALESCE(t.jumlah, 0)
+        FROM menu m
+        LEFT JOIN (
+            SELECT id_menu, COUNT(rating) AS jumlah, SUM(rating) AS total,
+                   COUNT(*) FILTER (WHERE rating = 1) AS r1, COUNT(*) FILTER (WHERE rating = 2) AS r2,
+                   COUNT(*) FILTER (WHERE rating = 3) AS r3, COUNT(*) FILTER (WHERE rating = 4) AS r4,
+                   COUNT(*) FILTER (WHERE rating = 5) AS r5
+            FROM ulasan GROUP BY id_menu
+        ) u ON u.id_menu = m.id
+        LEFT JOIN (
+            SELECT id_menu, COUNT(*) AS jumlah FROM menu_favorit GROUP BY id_menu
+        ) f ON f.id_menu = m.id
+        LEFT JOIN (
+            SELECT (e->>'id_menu')::INTEGER AS id_menu, SUM((e->>'qty')::INTEGER) AS jumlah
+            FROM pesanan p, jsonb_array_elements(p.item) e
+            WHERE p.status = 'Selesai' AND e ? 'id_menu'
+            GROUP BY 1
+        ) t ON t.id_menu = m.id
+        ON CONFLICT (id_menu) DO NOTHING;
+    """),
+    # Baris lama diisi oleh `python maintenance.py backfill-pesanan-item` (bertahap, tanpa mengunci tabel)
+    Migration(3, "tabel pesanan_item", """
+        CREATE TABLE IF NOT EXISTS pesanan_item (
+            id SERIAL PRIMARY KEY,
+            id_pesanan INTEGER NOT NULL REFERENCES pesanan(id) ON DELETE CASCADE,
+            id_menu INTEGER REFERENCES menu(id) ON DELETE SET NULL,
+            nama TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            harga_satuan NUMERIC NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pesanan_item_pesanan ON pesanan_item (id_pesanan);
+        CREATE INDEX IF NOT EXISTS idx_pesanan_item_menu ON pesanan_item (id_menu);
+    """),
+    Migration(4, "rollup penjualan_per_jam", """
+        CREATE TABLE IF NOT EXISTS penjualan_per_jam (
+            jam TIMESTAMP PRIMARY KEY,
+            pendapatan NUMERIC NOT NULL DEFAULT 0,
+            jumlah_pesanan INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT INTO penjualan_per_jam (jam, pendapatan, jumlah_pesanan)
+        SELECT date_trunc('hour', dibuat_pada), COALESCE(SUM(total), 0), COUNT(*)
+        FROM pesanan
+        WHERE status = 'Selesai' AND dibuat_pada IS NOT NULL
+        GROUP BY 1
+        ON CONFLICT (jam) DO NOTHING;
+    """),
+    # Indeks untuk kueri di database.py. Dibuat CONCURRENTLY agar tabel tetap bisa ditulis selama pembuatan.
+    # menu_favorit(id_pengguna) sudah dilayani oleh indeks UNIQUE(id_pengguna, id_menu).
+    # Rencana kueri bisa diperiksa dengan `python maintenance.py explain`.
+    Migration(5, "paket indeks kueri utama", (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        # get_user_orders
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pesanan_pengguna_dibuat ON pesanan (id_pengguna, dibuat_pada DESC)",
+        # list_orders_page dengan filter status, get_top_selling_items
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pesanan_status_dibuat ON pesanan (status, dibuat_pada DESC, id DESC)",
+        # list_orders_page tanpa filter status
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pesanan_dibuat ON pesanan (dibuat_pada DESC, id DESC)",
+        # get_reviews_for_menu
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ulasan_menu_dibuat ON ulasan (id_menu, dibuat_pada DESC)",
+        # get_all_reviews
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ulasan_dibuat ON ulasan (dibuat_pada DESC)",
+        # Foreign key: hapus pengguna / hapus menu
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ulasan_pengguna ON ulasan (id_pengguna)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_favorit_menu ON menu_favorit (id_menu)",
+        # get_all_menu: urutan kategori, nama. Indeks trigram untuk LOWER(nama) LIKE '%kata%' tidak
+        # dipakai lagi sejak pencarian beralih ke teks penuh (migrasi 7) dan dihapus di migrasi 11.
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_kategori_nama ON menu (kategori, nama)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_nama_trgm ON menu USING gin (LOWER(nama) gin_trgm_ops)",
+    ), transaksional=False),
+    # Versi katalog menu; dinaikkan oleh setiap penulisan menu agar cache katalog di semua proses
+    # tahu kapan harus memuat ulang (lihat catalog.py)
+    Migration(6, "versi katalog menu", """
+        CREATE TABLE IF NOT EXISTS katalog_versi (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            versi BIGINT NOT NULL DEFAULT 0
+        );
+        INSERT INTO katalog_versi (id, versi) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+    """),
+    # Pencarian teks penuh menu (lihat search_menu_ids). Konfigurasi 'menu_search' memakai stemmer
+    # bahasa Indonesia bila tersedia (PostgreSQL 13+), selain itu 'simple'. Sinonim disimpan di tabel
+    # karena kamus sinonim bawaan PostgreSQL membutuhkan berkas di server database.
+    Migration(7, "pencarian teks penuh menu", """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'menu_search') THEN
+                IF EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'indonesian') THEN
+                    CREATE TEXT SEARCH CONFIGURATION menu_search (COPY = pg_catalog.indonesian);
+                ELSE
+                    CREATE TEXT SEARCH CONFIGURATION menu_search (COPY = pg_catalog.simple);
+                END IF;
+            END IF;
+        END
+        $$;
+        ALTER TABLE menu ADD COLUMN IF NOT EXISTS vektor_pencarian tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('menu_search', COALESCE(nama, '')), 'A') ||
+            setweight(to_tsvector('menu_search', COALESCE(kategori, '')), 'B') ||
+            setweight(to_tsvector('menu_search', COALESCE(deskripsi, '')), 'C')
+        ) STORED;
+        CREATE TABLE IF NOT EXISTS sinonim_pencarian (
+            kata TEXT PRIMARY KEY,
+            grup INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sinonim_pencarian_grup ON sinonim_pencarian (grup);
+        INSERT INTO sinonim_pencarian (kata, grup) VALUES
+            ('kopi', 1), ('coffee', 1),
+            ('es', 2), ('iced', 2), ('ice', 2),
+            ('teh', 3), ('tea', 3),
+            ('susu', 4), ('milk', 4),
+            ('coklat', 5), ('cokelat', 5), ('chocolate', 5),
+            ('panas', 6), ('hot', 6),
+            ('roti', 7), ('bread', 7), ('toast', 7),
+            ('kue', 8), ('cake', 8),
+            ('jus', 9), ('juice', 9),
+            ('mie', 10), ('mi', 10), ('noodle', 10),
+            ('nasi', 11), ('rice', 11),
+            ('ayam', 12), ('chicken', 12),
+            ('kentang', 13), ('potato', 13), ('fries', 13)
+        ON CONFLICT (kata) DO NOTHING;
+    """),
+    Migration(8, "indeks GIN pencarian menu", (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_vektor_pencarian ON menu USING gin (vektor_pencarian)",
+    ), transaksional=False),
+    # URL turunan gambar menu (lihat images.py); gambar lama diisi dengan `python maintenance.py backfill-images`
+    Migration(9, "varian gambar menu", """
+        ALTER TABLE menu ADD COLUMN IF NOT EXISTS gambar_varian JSONB;
+    """),
+    # Status unggahan gambar di latar (lihat upload_service.py). unggahan_tertunda berisi hash gambar yang
+    # sedang diunggah; hanya unggahan dengan hash yang sama yang boleh menyelesaikan baris ini.
+    Migration(10, "status unggahan gambar menu", """
+        ALTER TABLE menu ADD COLUMN IF NOT EXISTS status_gambar TEXT NOT NULL DEFAULT 'siap';
+        ALTER TABLE menu ADD COLUMN IF NOT EXISTS unggahan_tertunda TEXT;
+    """),
+    # Tidak ada kueri yang memakai LOWER(nama) LIKE lagi (search_menu_ids memakai vektor_pencarian),
+    # jadi indeks trigram hanya menambah biaya setiap penulisan menu.
+    Migration(11, "hapus indeks trigram nama menu", (
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_menu_nama_trgm",
+    ), transaksional=False),
+    # Waktu mulai unggahan gambar yang tertunda; unggahan yang terlalu lama dianggap gagal
+    # (lihat database.image_status) agar baris tidak tertahan di status 'mengunggah' selamanya.
+    Migration(12, "waktu mulai unggahan gambar menu", """
+        ALTER TABLE menu ADD COLUMN IF NOT EXISTS unggahan_mulai TIMESTAMPTZ;
+        UPDATE menu SET unggahan_mulai = NOW() WHERE unggahan_tertunda IS NOT NULL AND unggahan_mulai IS NULL;
+    """),
+    # Pencabutan token sesi (logout, ganti sandi, ubah peran, hapus akun) agar berlaku di semua proses
+    # dan bertahan setelah restart. Setiap baris mencabut satu token (jti) atau semua token seorang
+    # pengguna yang terbit sebelum dicabut_pada; waktu dalam detik epoch seperti klaim token.
+    Migration(13, "pencabutan sesi", """
+        CREATE TABLE IF NOT EXISTS sesi_dicabut (
+            id BIGSERIAL PRIMARY KEY,
+            jti TEXT,
+            nama_pengguna TEXT,
+            dicabut_pada DOUBLE PRECISION NOT NULL,
+            kedaluwarsa DOUBLE PRECISION NOT NULL,
+            CHECK ((jti IS NULL) <> (nama_pengguna IS NULL))
+        );
+        CREATE INDEX IF NOT EXISTS idx_sesi_dicabut_kedaluwarsa ON sesi_dicabut (kedaluwarsa);
+    """),
+]
+
+LATEST_VERSION = max(m.versi for m in MIGRATIONS)
+
+# -------------------- PENERAPAN MIGRASI --------------------
+
+_lock = threading.Lock()
+_schema_ready = False
+_last_check = 0.0
+
+
+def _current_version(cur) -> int:
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(versi), 0) FROM schema_version")
+    return cur.fetchone()[0]
+
+
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+def _drop_invalid_index(cur, statement: str):
+    """CREATE INDEX CONCURRENTLY yang gagal meninggalkan indeks INVALID, dan IF NOT EXISTS akan
+    melewatinya selamanya. Hapus dulu sisa semacam itu agar indeks dibangun ulang."""
+    match = _CONCURRENT_INDEX.search(statement)
+    if not match:
+        return
+    cur.execute(
+        """
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace AND NOT i.indisvalid
+        """,
+        (match.group(1),),
+    )
+    if cur.fetchone():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+
+
+def _apply(conn, migration: Migration):
+    statements = (migration.sql,) if isinstance(migration.sql, str) else migration.sql
+    if migration.transaksional:
+        with conn.cursor() as cur:
+            cur.execute(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (versi, nama) VALUES (%s, %s)",
+                (migration.versi, migration.nama),
+            )
+        conn.commit()
+        return
+
+    # Perintah seperti CREATE INDEX CONCURRENTLY harus berjalan di luar blok transaksi.
+    # Setiap perintah harus idempoten (IF NOT EXISTS) karena bisa terulang jika proses mati di tengah jalan.
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for statement in statements:
+                _drop_invalid_index(cur, statement)
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (versi, nama) VALUES (%s, %s)",
+                (migration.versi, migration.nama),
+            )
+    finally:
+        conn.autocommit = False
+
+
+def _acquire_migration_lock(conn):
+    """Mengambil advisory lock migrasi tanpa menahan transaksi maupun snapshot.
+
+    Proses yang menunggu dengan pg_advisory_lock() memegang snapshot selama menunggu, dan
+    CREATE INDEX CONCURRENTLY di proses pemegang lock menunggu snapshot itu selesai (deadlock).
+    Karena itu lock dicoba berulang dengan pg_try_advisory_lock() di mode autocommit.
+    """
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            while True:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+                if cur.fetchone()[0]:
+                    return
+                time.sleep(LOCK_POLL_INTERVAL)
+    finally:
+        conn.autocommit = False
+
+
+def apply_migrations(conn) -> int:
+    """Menerapkan semua migrasi yang belum dijalankan dan mengembalikan versi skema terkini."""
+    with conn.cursor() as cur:
+        version = _current_version(cur)
+    conn.commit()
+    if version >= LATEST_VERSION:
+        return version
+
+    _acquire_migration_lock(conn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    versi INTEGER PRIMARY KEY,
+                    nama TEXT NOT NULL,
+                    diterapkan_pada TIMESTAMP DEFAULT NOW()
+                )
+                """
+            )
+            # Baca ulang setelah mendapat lock; proses lain mungkin sudah menerapkannya
+            version = _current_version(cur)
+        conn.commit()
+
+        for migration in sorted(MIGRATIONS, key=lambda m: m.versi):
+            if migration.versi > version:
+                _apply(conn, migration)
+                version = migration.versi
+        return version
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+
+
+def schema_version() -> int:
+    """Versi skema yang tercatat di database (0 jika belum pernah dimigrasi)."""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            version = _current_version(cur)
+        conn.commit()
+    return version
+
+
+def migrate() -> int:
+    """Menerapkan migrasi yang tertunda. Dijalankan saat deploy (`python maintenance.py migrate`),
+    bukan dari aplikasi, agar pemuatan halaman tidak pernah menunggu DDL atau lock migrasi."""
+    with get_db_conn() as conn:
+        return apply_migrations(conn)
+
+
+def require_schema():
+    """Menghentikan halaman jika skema database belum versi terbaru.
+
+    Aplikasi hanya memeriksa versi, tidak menjalankan migrasi. Setelah siap, hasilnya disimpan
+    per proses; selama belum siap, database diperiksa ulang paling sering tiap
+    SCHEMA_RECHECK_SECONDS agar rerun tidak membanjiri database.
+    """
+    global _schema_ready, _last_check
+    if _schema_ready:
+        return
+    with _lock:
+        now = time.monotonic()
+        if not _schema_ready and now - _last_check >= SCHEMA_RECHECK_SECONDS:
+            _last_check = now
+            try:
+                _schema_ready = schema_version() >= LATEST_VERSION
+            except Exception as e:
+                st.error(f"Kesalahan memeriksa skema database: {e}")
+                st.stop()
+    if not _schema_ready:
+        st.warning("Aplikasi sedang diperbarui. Silakan muat ulang halaman beberapa saat lagi.")
+        st.stop()
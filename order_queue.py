@@ -0,0 +1,150 @@
+"""
+Antrean penulisan pesanan untuk aplikasi Caffe Dehh
+Checkout tidak menulis pesanan dengan transaksinya sendiri; pesanan dimasukkan ke antrean dalam proses
+dan satu thread penulis menyimpan beberapa pesanan sekaligus dalam satu transaksi (group commit),
+sehingga saat jam sibuk satu commit (dan satu fsync) melayani banyak pelanggan.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, List, NamedTuple, Optional
+
+import streamlit as st
+
+import database
+from config import ORDER_BATCH_MAX, ORDER_FLUSH_INTERVAL_MS, ORDER_SUBMIT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class OrderPending(Exception):
+    """Pesanan sudah mulai ditulis tetapi belum selesai dalam ORDER_SUBMIT_TIMEOUT.
+    `future` menghasilkan id pesanan (atau kesalahannya) setelah penulisan selesai."""
+
+    def __init__(self, future: Future):
+        super().__init__("Pesanan sedang diproses")
+        self.future = future
+
+
+class OrderStatusUnknown(Exception):
+    """Penulisan gagal dan database tidak dapat dihubungi untuk memastikan apakah pesanan tersimpan."""
+
+
+class PendingOrder(NamedTuple):
+    user_id: int
+    items: List[Dict]
+    total: float
+    payment_method: str
+    future: Future
+
+
+class OrderQueue:
+    """Thread penulis tunggal yang mengumpulkan pesanan menjadi batch.
+
+    Latensi tambahan paling lama `flush_interval` detik; makin ramai antrean, makin besar batch dan makin
+    sedikit commit per pesanan.
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[PendingOrder]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="penulis-pesanan", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id: int, items: List[Dict], total, payment_method: str) -> Future:
+        """Memasukkan pesanan ke antrean. Hasil Future: id pesanan setelah di-commit."""
+        future: Future = Future()
+        self._queue.put(PendingOrder(user_id, items, total, payment_method, future))
+        return future
+
+    def _next_batch(self) -> List[PendingOrder]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, ids: List[int], batch: List[PendingOrder]) -> Optional[Exception]:
+        """Menulis `batch` dengan id `ids`. Mengembalikan None jika tersimpan, atau kesalahannya jika
+        pasti tidak tersimpan (aman ditulis ulang). Kegagalan saat commit bisa terjadi setelah
+        transaksi tersimpan, jadi keberadaan id diperiksa dulu; jika itu pun gagal, OrderStatusUnknown."""
+        try:
+            database.create_orders(ids, [(o.user_id, o.items, o.total, o.payment_method) for o in batch])
+            return None
+        except Exception as error:
+            try:
+                # Satu transaksi: semua id tersimpan atau tidak sama sekali
+                committed = bool(database.existing_order_ids(ids))
+            except Exception as e:
+                raise OrderStatusUnknown("Status pesanan tidak dapat dipastikan; periksa riwayat pesanan") from e
+            return None if committed else error
+
+    def _write(self, batch: List[PendingOrder]):
+        # Pesanan yang sudah dibatalkan pemanggilnya (batas waktu habis) tidak ditulis
+        batch = [o for o in batch if o.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            ids = database.allocate_order_ids(len(batch))
+            error = self._commit(ids, batch)
+        except Exception as e:
+            for o in batch:
+                o.future.set_exception(e)
+            return
+        if error is None:
+            for o, order_id in zip(batch, ids):
+                o.future.set_result(order_id)
+            return
+        if len(batch) == 1:
+            batch[0].future.set_exception(error)
+            return
+        # Satu pesanan bermasalah tidak boleh menggagalkan pesanan lain di batch yang sama.
+        # Batch pasti tidak tersimpan, jadi setiap pesanan ditulis ulang dengan id yang sama.
+        logger.error("Batch %s pesanan gagal (%s); ditulis satu per satu", len(batch), error)
+        for o, order_id in zip(batch, ids):
+            try:
+                error = self._commit([order_id], [o])
+            except Exception as e:
+                error = e
+            if error is None:
+                o.future.set_result(order_id)
+            else:
+                o.future.set_exception(error)
+
+    def _run(self):
+        while True:
+            self._write(self._next_batch())
+
+
+@st.cache_resource(show_spinner=False)
+def get_order_queue() -> OrderQueue:
+    """Thread penulis dimulai saat checkout pertama; batch diatur ORDER_BATCH_MAX dan ORDER_FLUSH_INTERVAL_MS."""
+    return OrderQueue(ORDER_BATCH_MAX, ORDER_FLUSH_INTERVAL_MS / 1000)
+
+
+def place_order(user_id: int, items: List[Dict], total, payment_method: str) -> int:
+    """Menulis pesanan lewat antrean dan menunggu id-nya. Kesalahan penulisan dilempar ulang ke pemanggil.
+
+    Jika batas waktu habis sebelum penulis mengambil pesanan, pesanan dibatalkan (TimeoutError, aman
+    diulang). Jika penulis sudah mulai menulisnya, OrderPending dilempar agar pemanggil menunggu
+    hasilnya alih-alih mengirim ulang pesanan yang mungkin sudah tersimpan.
+    """
+    future = get_order_queue().submit(user_id, items, total, payment_method)
+    try:
+        return future.result(timeout=ORDER_SUBMIT_TIMEOUT)
+    except FutureTimeout:
+        if future.cancel():
+            raise TimeoutError("Antrean pesanan sedang penuh; pesanan belum dibuat, silakan coba lagi") from None
+        if future.done():
+            return future.result()
+        raise OrderPending(future) from None
@@ -0,0 +1,119 @@
+"""
+Indeks pencarian ketik-langsung (typeahead) dalam memori untuk aplikasi Caffe Dehh
+Dibangun dari katalog menu yang di-cache sehingga pencarian per ketikan tidak menyentuh database.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set
+
+# Awalan yang lebih panjang dari ini ditangani oleh indeks n-gram
+MAX_PREFIX = 20
+NGRAM = 3
+
+# Skor per kata pencarian: awalan kata di nama paling relevan, potongan kata di deskripsi paling rendah
+SCORE_NAME_PREFIX = 3.0
+SCORE_NAME_INFIX = 2.0
+SCORE_DESC_PREFIX = 1.0
+SCORE_DESC_INFIX = 0.5
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Huruf kecil tanpa diakritik, mis. 'Café' -> 'cafe'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TypeaheadIndex:
+    """Indeks awalan kata dan trigram atas nama dan deskripsi menu.
+
+    - Awalan (hingga MAX_PREFIX huruf) dari setiap kata dipetakan ke id menu, sehingga kata yang
+      sedang diketik langsung cocok ('kop' -> 'Kopi Susu').
+    - Trigram dari teks lengkap menangani potongan di tengah kata ('usu' -> 'Kopi Susu'); kandidat
+      diverifikasi dengan pencocokan substring.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]]):
+        self._names: Dict[int, str] = {}
+        self._name_text: Dict[int, str] = {}
+        self._desc_text: Dict[int, str] = {}
+        self._name_prefix: Dict[str, Set[int]] = defaultdict(set)
+        self._desc_prefix: Dict[str, Set[int]] = defaultdict(set)
+        self._ngram: Dict[str, Set[int]] = defaultdict(set)
+
+        for item in items:
+            mid = item["id"]
+            self._names[mid] = item["nama"]
+            self._name_text[mid] = " ".join(tokenize(item["nama"]))
+            self._desc_text[mid] = " ".join(tokenize(item.get("deskripsi") or ""))
+            for field, prefix_map in ((self._name_text, self._name_prefix), (self._desc_text, self._desc_prefix)):
+                for word in field[mid].split():
+                    for n in range(1, min(len(word), MAX_PREFIX) + 1):
+                        prefix_map[word[:n]].add(mid)
+                for gram in _ngrams(field[mid]):
+                    self._ngram[gram].add(mid)
+
+        # Peta biasa untuk pencarian; defaultdict tidak boleh bertambah saat dibaca dari banyak thread
+        self._name_prefix = dict(self._name_prefix)
+        self._desc_prefix = dict(self._desc_prefix)
+        self._ngram = dict(self._ngram)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for mid in self._desc_prefix.get(term, ()):
+            scores[mid] = SCORE_DESC_PREFIX
+        for mid in self._name_prefix.get(term, ()):
+            scores[mid] = SCORE_NAME_PREFIX
+
+        if len(term) >= NGRAM:
+            grams = _ngrams(term)
+            candidates = None
+            for gram in grams:
+                ids = self._ngram.get(gram)
+                if not ids:
+                    candidates = set()
+                    break
+                candidates = set(ids) if candidates is None else candidates & ids
+            for mid in candidates or ():
+                if mid in scores and scores[mid] >= SCORE_NAME_INFIX:
+                    continue
+                if term in self._name_text[mid]:
+                    scores[mid] = SCORE_NAME_INFIX
+                elif mid not in scores and term in self._desc_text[mid]:
+                    scores[mid] = SCORE_DESC_INFIX
+        return scores
+
+    def search(self, query: str, limit: int = None) -> List[int]:
+        """Id menu yang memuat semua kata pencarian, diurutkan dari yang paling relevan."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        total: Dict[int, float] = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if total is None:
+                total = scores
+            else:
+                total = {mid: total[mid] + score for mid, score in scores.items() if mid in total}
+            if not total:
+                return []
+        ranked = sorted(total, key=lambda mid: (-total[mid], self._name_text[mid]))
+        return ranked[:limit] if limit else ranked
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """Nama menu teratas untuk ditampilkan sebagai saran saat mengetik."""
+        return [self._names[mid] for mid in self.search(query, limit)]
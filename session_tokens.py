@@ -0,0 +1,239 @@
+"""
+Token sesi bertanda tangan untuk aplikasi Caffe Dehh
+Setelah login, data pengguna ditandatangani (HMAC-SHA256) bersama waktu kedaluwarsa dan disimpan di
+cookie browser (bukan di URL, agar tidak ikut tersimpan di riwayat browser atau tersalin bersama tautan).
+Ketika browser dimuat ulang atau sesi Streamlit baru dibuat, token dari cookie diverifikasi di memori
+sehingga pengguna tidak perlu login lagi dan tidak ada kueri database.
+
+Logout dan perubahan akun mencabut token secara permanen: pencabutan dicatat di tabel sesi_dicabut dan
+dibaca ulang oleh setiap proses secara berkala.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import streamlit as st
+
+import database
+from config import SESSION_REVOCATION_REFRESH, SESSION_SECRET, SESSION_TTL
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "sesi"
+# Nama parameter URL versi lama; token yang masih ada di URL dihapus saat halaman dibuka
+QUERY_PARAM = "sesi"
+
+_SECRET = (SESSION_SECRET or secrets.token_hex(32)).encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+# (jti, nama_pengguna, dicabut_pada, kedaluwarsa); tepat satu dari jti/nama_pengguna terisi
+Revocation = Tuple[Optional[str], Optional[str], float, float]
+
+
+class RevocationList:
+    """Daftar pencabutan token, disimpan di memori dan (opsional) di database.
+
+    Menyimpan id token (jti) yang sudah logout sampai token itu kedaluwarsa, dan waktu pencabutan per
+    pengguna (ganti sandi, ubah peran, hapus akun) yang membatalkan semua token yang terbit sebelumnya.
+    Dengan `save`/`load`, pencabutan ditulis ke penyimpanan bersama dan isi memori diganti dengan
+    hasil `load(now)` paling lambat setiap `refresh_interval` detik, sehingga pencabutan dari proses
+    lain atau sebelum restart ikut berlaku. Jika `load` gagal, isi terakhir tetap dipakai dan pembacaan
+    dicoba lagi setelah `refresh_interval`. Ukurannya kecil karena entri dibuang setelah kedaluwarsa.
+    """
+
+    def __init__(self, save: Callable[..., None] = None, load: Callable[[float], Iterable[Revocation]] = None,
+                 refresh_interval: float = SESSION_REVOCATION_REFRESH):
+        self._lock = threading.Lock()
+        self._save = save
+        self._load = load
+        self._refresh_interval = refresh_interval
+        self._loaded_at: Optional[float] = None
+        self._tokens: Dict[str, float] = {}   # jti -> waktu kedaluwarsa token
+        self._users: Dict[str, float] = {}    # nama_pengguna -> waktu pencabutan
+
+    def _prune(self, now: float):
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        self._users = {name: at for name, at in self._users.items() if at + SESSION_TTL > now}
+
+    def _refresh(self, now: float):
+        if self._load is None:
+            return
+        if self._loaded_at is not None and now - self._loaded_at < self._refresh_interval:
+            return
+        tokens, users = {}, {}
+        try:
+            for jti, username, revoked_at, expires in self._load(now):
+                if jti:
+                    tokens[jti] = expires
+                else:
+                    users[username] = max(users.get(username, 0), revoked_at)
+        except Exception:
+            # Database sesaat tidak tersedia tidak boleh menggagalkan pemuatan halaman
+            logger.exception("Gagal membaca daftar pencabutan sesi; memakai daftar terakhir")
+            self._loaded_at = now
+            return
+        self._tokens, self._users, self._loaded_at = tokens, users, now
+
+    def revoke_token(self, jti: str, expires: float):
+        with self._lock:
+            now = time.time()
+            if self._save:
+                self._save(jti, None, now, expires)
+            self._prune(now)
+            self._tokens[jti] = expires
+
+    def revoke_user(self, username: str):
+        with self._lock:
+            now = time.time()
+            if self._save:
+                self._save(None, username, now, now + SESSION_TTL)
+            self._prune(now)
+            self._users[username] = now
+
+    def is_revoked(self, claims: dict) -> bool:
+        with self._lock:
+            self._refresh(time.time())
+            return claims["jti"] in self._tokens or claims["iat"] <= self._users.get(claims["n"], 0)
+
+
+@st.cache_resource(show_spinner=False)
+def get_revocation_list() -> RevocationList:
+    """Pencabutan dari tabel sesi_dicabut, dibaca ulang setiap SESSION_REVOCATION_REFRESH detik."""
+    return RevocationList(save=database.save_session_revocation, load=database.load_session_revocations)
+
+
+def issue_token(user: dict) -> str:
+    """Token untuk pengguna hasil authenticate(): {"id", "nama_pengguna", "peran"}."""
+    now = time.time()
+    claims = {
+        "u": user["id"],
+        "n": user["nama_pengguna"],
+        "r": user["peran"],
+        "iat": now,
+        "exp": now + SESSION_TTL,
+        "jti": secrets.token_urlsafe(12),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def _claims(token: str) -> Optional[dict]:
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        if claims["exp"] <= time.time() or get_revocation_list().is_revoked(claims):
+            return None
+    except (ValueError, TypeError, KeyError):
+        return None
+    return claims
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Data pengguna dari token yang sah, atau None jika tanda tangan salah, kedaluwarsa atau dicabut."""
+    claims = _claims(token)
+    if claims is None:
+        return None
+    return {"id": claims["u"], "nama_pengguna": claims["n"], "peran": claims["r"]}
+
+
+def revoke_token(token: str):
+    """Mencabut token (logout). Token yang memang tidak sah diabaikan."""
+    claims = _claims(token)
+    if claims is not None:
+        get_revocation_list().revoke_token(claims["jti"], claims["exp"])
+
+
+def revoke_user(username: str):
+    """Membatalkan semua token pengguna yang terbit sebelum saat ini."""
+    get_revocation_list().revoke_user(username)
+
+
+# --- Integrasi Streamlit ---
+
+def _cookie_token() -> Optional[str]:
+    return st.context.cookies.get(COOKIE_NAME)
+
+
+def sync_session_cookie():
+    """Menulis (atau menghapus) cookie sesi yang tertunda. Dipanggil sekali per rerun dari main.py.
+
+    Cookie hanya bisa ditulis oleh browser, jadi penulisannya dikirim sebagai skrip kecil; st.context.cookies
+    membaca cookie yang dikirim saat sesi Streamlit dibuat.
+    """
+    if 'session_cookie' not in st.session_state:
+        return
+    token = st.session_state.pop('session_cookie')
+    max_age = int(SESSION_TTL) if token else 0
+    cookie = f"{COOKIE_NAME}={token}; Max-Age={max_age}; Path=/; SameSite=Strict"
+    st.html(
+        f"<script>document.cookie = {json.dumps(cookie)} + "
+        f"(location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+
+def start_session(user: dict, token: str = None):
+    """Mengisi session_state setelah login (token baru disimpan ke cookie) atau pemulihan token dari cookie."""
+    st.session_state['user'] = user
+    st.session_state['logged_in'] = True
+    st.session_state['nama_pengguna'] = user['nama_pengguna']
+    st.session_state['peran'] = user['peran']
+    st.session_state['page'] = 'admin_dashboard' if user['peran'] == 'admin' else 'user_dashboard'
+    if token is None:
+        token = issue_token(user)
+        st.session_state['session_cookie'] = token
+    st.session_state['session_token'] = token
+
+
+def restore_session() -> bool:
+    """Memulihkan login dari cookie sesi untuk sesi baru (mis. setelah browser dimuat ulang).
+
+    Hanya dicoba sekali per sesi Streamlit; token yang tidak sah lagi dihapus dari cookie.
+    """
+    if QUERY_PARAM in st.query_params:
+        del st.query_params[QUERY_PARAM]
+    if st.session_state.get('logged_in') or st.session_state.get('session_checked'):
+        return False
+    st.session_state['session_checked'] = True
+    token = _cookie_token()
+    if not token:
+        return False
+    user = verify_token(token)
+    if user is None:
+        st.session_state['session_cookie'] = ""
+        return False
+    start_session(user, token)
+    return True
+
+
+def end_session():
+    """Logout: mencabut token sesi, menghapus cookie dan mengosongkan session_state."""
+    token = st.session_state.get('session_token')
+    if token:
+        revoke_token(token)
+    st.session_state.clear()
+    st.session_state['page'] = 'login'
+    # Cookie yang dibaca saat sesi dibuat masih terlihat di st.context.cookies; jangan dipulihkan lagi
+    st.session_state['session_checked'] = True
+    st.session_state['session_cookie'] = ""
@@ -3,9 +3,17 @@ Operasi penyimpanan Supabase untuk aplikasi Caffe Dehh
 Menangani pengunggahan gambar dan manajemen penyimpanan
 """
 
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import unquote, urlparse
+
 import streamlit as st
+from storage3.utils import StorageException
 from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_KEY, STORAGE_BUCKET
+from config import SUPABASE_URL, SUPABASE_KEY, STORAGE_BUCKET, IMAGE_CACHE_MAX_AGE
+from images import make_derivatives, placeholder_color, variant_sizes, variants_manifest
 
 # -------------------- UTILITAS PENYIMPANAN --------------------
 
@@ -16,23 +24,97 @@ def get_supabase():
         return None
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def upload_image_to_storage(file_bytes: bytes, filename: str) -> str:
+def _public_url(path: str) -> str:
+    return get_supabase().storage.from_(STORAGE_BUCKET).get_public_url(path)
+
+def _upload_once(path: str, data: bytes, content_type: str):
+    """Mengunggah objek beralamat konten. Nama objek ditentukan oleh isinya, jadi objek yang sudah
+    ada (mis. diunggah bersamaan oleh sesi lain) sudah benar dan tidak perlu ditimpa."""
+    try:
+        get_supabase().storage.from_(STORAGE_BUCKET).upload(
+            path, data, {"content-type": content_type, "cache-control": str(IMAGE_CACHE_MAX_AGE)}
+        )
+    except StorageException as e:
+        if str(getattr(e, "status", "")) == "409" or getattr(e, "code", "") == "Duplicate":
+            return
+        raise
+
+def content_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def _manifest(file_bytes: bytes, digest: str) -> Dict[str, dict]:
+    return variants_manifest(
+        variant_sizes(file_bytes),
+        lambda v, f: _public_url(f"{digest}/{v}.{f}"),
+        placeholder_color(file_bytes),
+    )
+
+def upload_derivatives(file_bytes: bytes, digest: str = None) -> Dict[str, dict]:
+    """Membuat dan mengunggah varian gambar (thumb/card/detail, WebP + JPEG) ke folder <hash>/,
+    lalu mengembalikan manifest untuk kolom menu.gambar_varian."""
+    if not get_supabase():
+        raise Exception("Klien Supabase tidak dikonfigurasi")
+    digest = digest or content_digest(file_bytes)
+    for d in make_derivatives(file_bytes):
+        _upload_once(f"{digest}/{d.varian}.{d.format}", d.data, d.content_type)
+    return _manifest(file_bytes, digest)
+
+def upload_menu_image(file_bytes: bytes, filename: str) -> Tuple[str, Dict[str, dict]]:
+    """Mengunggah gambar asli beserta turunannya dengan nama berdasarkan hash SHA-256 isinya.
+    Mengembalikan (url_gambar, gambar_varian); `filename` hanya dipakai untuk ekstensi.
+
+    Gambar yang sama tidak pernah diunggah dua kali, dan URL-nya tidak berubah selama isinya sama
+    sehingga aman di-cache lama oleh browser dan CDN.
+    Melempar ValueError jika berkas bukan gambar yang valid (sebelum apa pun diunggah)."""
     sb = get_supabase()
     if not sb:
         raise Exception("Klien Supabase tidak dikonfigurasi")
-    
-    path = f"{filename}"
-    try:
-        # Pustaka supabase-py v2 akan langsung memberikan galat (exception) jika gagal,
-        # jadi kita tidak perlu lagi memeriksa 'error' secara manual dengan .get().
-        sb.storage.from_(STORAGE_BUCKET).upload(path, file_bytes)
-        
-        # Fungsi get_public_url sekarang mengembalikan URL dalam bentuk string secara langsung.
-        public_url = sb.storage.from_(STORAGE_BUCKET).get_public_url(path)
-        return public_url
-    except Exception as e:
-        # Menangkap dan meneruskan galat agar dapat ditampilkan di antarmuka pengguna.
-        raise e
+    digest = content_digest(file_bytes)
+    path = f"{digest}{os.path.splitext(filename)[1].lower()}"
+    # Berkas asli diunggah paling akhir, jadi jika sudah ada maka semua turunannya juga sudah ada
+    if sb.storage.from_(STORAGE_BUCKET).exists(path):
+        variants = _manifest(file_bytes, digest)
+        return _public_url(path), variants
+    variants = upload_derivatives(file_bytes, digest)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    _upload_once(path, file_bytes, content_type)
+    return _public_url(path), variants
+
+def storage_path_from_url(url: str) -> str:
+    """Path objek di bucket dari URL publik Supabase (.../object/public/<bucket>/<path>)."""
+    marker = f"/object/public/{STORAGE_BUCKET}/"
+    path = urlparse(url).path
+    if marker not in path:
+        return None
+    return unquote(path.split(marker, 1)[1])
+
+def download_image(path: str) -> bytes:
+    sb = get_supabase()
+    if not sb:
+        raise Exception("Klien Supabase tidak dikonfigurasi")
+    return sb.storage.from_(STORAGE_BUCKET).download(path)
+
+def list_objects(prefix: str = "", page_size: int = 1000) -> Iterator[dict]:
+    """Semua entri tepat di bawah `prefix` (tidak rekursif), diambil per halaman dan diurutkan
+    berdasarkan nama. Entri folder memiliki id None."""
+    sb = get_supabase()
+    if not sb:
+        raise Exception("Klien Supabase tidak dikonfigurasi")
+    bucket = sb.storage.from_(STORAGE_BUCKET)
+    offset = 0
+    while True:
+        page = bucket.list(prefix, {"limit": page_size, "offset": offset, "sortBy": {"column": "name", "order": "asc"}})
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+def remove_objects(paths: List[str]):
+    """Menghapus beberapa objek dalam satu permintaan."""
+    sb = get_supabase()
+    if not sb:
+        raise Exception("Klien Supabase tidak dikonfigurasi")
+    return sb.storage.from_(STORAGE_BUCKET).remove(paths)
 
 def delete_image_from_storage(filename: str):
     sb = get_supabase()
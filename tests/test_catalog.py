@@ -0,0 +1,110 @@
+"""Tes VersionedCache: muat ulang berdasarkan versi, invalidate, dan balapan dengan muat ulang latar."""
+
+import threading
+import time
+
+from catalog import VersionedCache
+
+
+class Source:
+    def __init__(self):
+        self.version = 1
+        self.data = "v1"
+        self.loads = 0
+        self.gate = None  # Event yang ditunggu loader di thread selain thread utama
+
+    def load(self):
+        self.loads += 1
+        version, data = self.version, self.data
+        if self.gate and threading.current_thread() is not threading.main_thread():
+            self.started.set()
+            self.gate.wait(5)
+        return version, data
+
+    def publish(self, data):
+        self.version += 1
+        self.data = data
+
+
+def _wait_idle(cache, timeout=5):
+    deadline = time.monotonic() + timeout
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_serves_from_memory_within_ttl():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=60, max_age=600)
+    assert cache.get() == "v1"
+    src.publish("v2")
+    assert cache.get() == "v1"
+    assert src.loads == 1
+
+
+def test_invalidate_reloads_synchronously():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=60, max_age=600)
+    cache.get()
+    src.publish("v2")
+    cache.invalidate()
+    assert cache.get() == "v2"
+
+
+def test_stale_snapshot_is_revalidated_in_background():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=0, max_age=600)
+    cache.get()
+    src.publish("v2")
+    assert cache.get() == "v1"  # stale-while-revalidate
+    _wait_idle(cache)
+    assert cache.get() == "v2"
+
+
+def test_unchanged_version_skips_reload():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=0, max_age=600)
+    cache.get()
+    cache.get()
+    _wait_idle(cache)
+    assert src.loads == 1
+
+
+def test_background_reload_started_before_invalidate_is_discarded():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=0, max_age=600)
+    cache.get()
+    src.gate, src.started = threading.Event(), threading.Event()
+    src.publish("v2")
+    cache.get()  # memulai revalidasi latar yang membaca v2 lalu tertahan
+    assert src.started.wait(5)
+
+    src.publish("v3")  # penulisan admin di proses ini
+    cache.invalidate()
+    threading.Timer(0.1, src.gate.set).start()
+    assert cache.get() == "v3"
+    _wait_idle(cache)
+    assert cache._snapshot.data == "v3"
+
+
+def test_loader_error_keeps_serving_old_data():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=0, max_age=600)
+    cache.get()
+    src.publish("v2")
+    cache._loader = lambda: (_ for _ in ()).throw(RuntimeError("database mati"))
+    cache.get()
+    _wait_idle(cache)
+    assert cache.get() == "v1"
+
+
+def test_derived_values_are_rebuilt_only_after_reload():
+    src = Source()
+    cache = VersionedCache(src.load, lambda: src.version, ttl=60, max_age=600)
+    builds = []
+    build = lambda data: builds.append(data) or data.upper()
+    assert cache.derive("besar", build) == "V1"
+    assert cache.derive("besar", build) == "V1"
+    src.publish("v2")
+    cache.invalidate()
+    assert cache.derive("besar", build) == "V2"
+    assert builds == ["v1", "v2"]
@@ -0,0 +1,118 @@
+"""Tes penulis pesanan: batch, pemisahan batch yang gagal, commit yang tersimpan tetapi gagal dikonfirmasi."""
+
+import itertools
+from concurrent.futures import Future
+
+import pytest
+
+import order_queue
+from order_queue import OrderQueue, OrderStatusUnknown, PendingOrder
+
+
+class FakeOrders:
+    """Pengganti fungsi pesanan di database.py; menyimpan pesanan di dict."""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+        self.bad_users = set()
+        self.lose_ack = False
+        self.exists_error = None
+        self._ids = itertools.count(1)
+
+    def allocate_order_ids(self, count):
+        return [next(self._ids) for _ in range(count)]
+
+    def create_orders(self, ids, orders):
+        self.calls.append(list(ids))
+        if any(user_id in self.bad_users for user_id, _, _, _ in orders):
+            raise ValueError("pengguna tidak ada")
+        for oid, order in zip(ids, orders):
+            assert oid not in self.rows, "pesanan ganda"
+            self.rows[oid] = order
+        if self.lose_ack:
+            raise ConnectionError("koneksi putus setelah COMMIT")
+
+    def existing_order_ids(self, ids):
+        if self.exists_error:
+            raise self.exists_error
+        return {oid for oid in ids if oid in self.rows}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeOrders()
+    for name in ("allocate_order_ids", "create_orders", "existing_order_ids"):
+        monkeypatch.setattr(order_queue.database, name, getattr(fake, name))
+    return fake
+
+
+@pytest.fixture
+def writer():
+    # Thread penulis menunggu antrean yang tidak pernah diisi; _write dipanggil langsung agar tes deterministik
+    return OrderQueue(max_batch=10, flush_interval=0.01)
+
+
+def _orders(*user_ids):
+    return [PendingOrder(uid, [{"id_menu": 1, "qty": 1}], 1000, "Tunai", Future()) for uid in user_ids]
+
+
+def test_batch_is_written_in_one_call(db, writer):
+    batch = _orders(1, 2, 3)
+    writer._write(batch)
+    assert db.calls == [[1, 2, 3]]
+    assert [o.future.result(0) for o in batch] == [1, 2, 3]
+
+
+def test_failed_batch_is_retried_per_order_with_the_same_ids(db, writer):
+    db.bad_users = {2}
+    batch = _orders(1, 2, 3)
+    writer._write(batch)
+    assert db.calls == [[1, 2, 3], [1], [2], [3]]
+    assert batch[0].future.result(0) == 1
+    assert isinstance(batch[1].future.exception(0), ValueError)
+    assert batch[2].future.result(0) == 3
+    assert sorted(db.rows) == [1, 3]
+
+
+def test_committed_batch_with_lost_ack_is_not_written_again(db, writer):
+    db.lose_ack = True
+    batch = _orders(1, 2)
+    writer._write(batch)
+    assert db.calls == [[1, 2]]
+    assert [o.future.result(0) for o in batch] == [1, 2]
+    assert len(db.rows) == 2
+
+
+def test_unknown_commit_state_fails_without_retry(db, writer):
+    db.bad_users = {1}
+    db.exists_error = ConnectionError("database tidak dapat dihubungi")
+    batch = _orders(1, 2)
+    writer._write(batch)
+    assert db.calls == [[1, 2]]
+    for o in batch:
+        assert isinstance(o.future.exception(0), OrderStatusUnknown)
+
+
+def test_single_order_failure_is_reported(db, writer):
+    db.bad_users = {1}
+    [order] = batch = _orders(1)
+    writer._write(batch)
+    assert db.calls == [[1]]
+    assert isinstance(order.future.exception(0), ValueError)
+
+
+def test_cancelled_orders_are_not_written(db, writer):
+    batch = _orders(1, 2)
+    assert batch[0].future.cancel()
+    writer._write(batch)
+    assert db.calls == [[1]]
+    assert list(db.rows.values())[0][0] == 2
+    assert batch[1].future.result(0) == 1
+
+
+def test_concurrent_submits_share_a_batch(db):
+    queue = OrderQueue(max_batch=5, flush_interval=0.5)
+    futures = [queue.submit(uid, [], 1000, "Tunai") for uid in range(5)]
+    assert sorted(f.result(5) for f in futures) == [1, 2, 3, 4, 5]
+    assert db.calls == [[1, 2, 3, 4, 5]]
@@ -0,0 +1,48 @@
+"""Tes indeks pencarian ketik-langsung."""
+
+from search_index import TypeaheadIndex, normalize
+
+ITEMS = [
+    {"id": 1, "nama": "Kopi Susu", "deskripsi": "Espresso dengan susu segar"},
+    {"id": 2, "nama": "Es Teh Manis", "deskripsi": ""},
+    {"id": 3, "nama": "Café Latte", "deskripsi": None},
+    {"id": 4, "nama": "Roti Bakar", "deskripsi": "Roti dengan selai kopi"},
+]
+
+
+def test_normalize_strips_diacritics():
+    assert normalize("Café LATTE") == "cafe latte"
+
+
+def test_prefix_of_word_matches():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("kop") == [1, 4]
+
+
+def test_name_match_ranks_before_description_match():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("kopi")[0] == 1
+
+
+def test_infix_matches_through_trigrams():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("usu") == [1]
+    assert index.search("akar") == [4]
+
+
+def test_all_terms_must_match():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("es manis") == [2]
+    assert index.search("teh kopi") == []
+
+
+def test_accents_are_ignored():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("cafe") == [3]
+
+
+def test_empty_query_and_suggestions():
+    index = TypeaheadIndex(ITEMS)
+    assert index.search("  ") == []
+    assert index.suggest("ro") == ["Roti Bakar"]
+    assert len(index) == 4
@@ -0,0 +1,165 @@
+"""Tes token sesi: tanda tangan, kedaluwarsa, manipulasi dan pencabutan (tanpa database)."""
+
+import json
+
+import pytest
+
+import session_tokens
+from session_tokens import RevocationList, _b64decode, _b64encode, issue_token, revoke_token, revoke_user, verify_token
+
+USER = {"id": 7, "nama_pengguna": "budi", "peran": "user"}
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(session_tokens.time, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def revocations(monkeypatch):
+    revocation_list = RevocationList()
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: revocation_list)
+    return revocation_list
+
+
+def _tamper(token, **changes):
+    payload, signature = token.split(".")
+    claims = json.loads(_b64decode(payload))
+    claims.update(changes)
+    return f"{_b64encode(json.dumps(claims).encode())}.{signature}"
+
+
+def test_issue_and_verify_roundtrip(clock, revocations):
+    assert verify_token(issue_token(USER)) == USER
+
+
+def test_each_token_has_unique_id(clock, revocations):
+    assert issue_token(USER) != issue_token(USER)
+
+
+def test_token_expires_after_ttl(clock, revocations):
+    token = issue_token(USER)
+    clock.now += session_tokens.SESSION_TTL - 1
+    assert verify_token(token) == USER
+    clock.now += 1
+    assert verify_token(token) is None
+
+
+def test_tampered_payload_is_rejected(clock, revocations):
+    token = issue_token(USER)
+    assert verify_token(_tamper(token, r="admin")) is None
+    assert verify_token(_tamper(token, exp=clock.now + 10 * session_tokens.SESSION_TTL)) is None
+
+
+def test_tampered_signature_is_rejected(clock, revocations):
+    payload, signature = issue_token(USER).split(".")
+    forged = signature[:-1] + ("A" if signature[-1] != "A" else "B")
+    assert verify_token(f"{payload}.{forged}") is None
+
+
+def test_token_signed_with_other_secret_is_rejected(clock, revocations, monkeypatch):
+    token = issue_token(USER)
+    monkeypatch.setattr(session_tokens, "_SECRET", b"kunci-lain")
+    assert verify_token(token) is None
+
+
+@pytest.mark.parametrize("token", ["", "bukan-token", "a.b.c", "!!!.???", "e30.xyz"])
+def test_malformed_tokens_are_rejected(clock, revocations, token):
+    assert verify_token(token) is None
+
+
+def test_revoked_token_is_rejected(clock, revocations):
+    token = issue_token(USER)
+    other = issue_token(USER)
+    revoke_token(token)
+    assert verify_token(token) is None
+    assert verify_token(other) == USER
+
+
+def test_revoke_user_rejects_older_tokens_only(clock, revocations):
+    old = issue_token(USER)
+    other_user = issue_token({"id": 8, "nama_pengguna": "sari", "peran": "user"})
+    clock.now += 1
+    revoke_user(USER["nama_pengguna"])
+    clock.now += 1
+    new = issue_token(USER)
+    assert verify_token(old) is None
+    assert verify_token(new) == USER
+    assert verify_token(other_user) is not None
+
+
+def test_revocations_are_pruned_after_expiry(clock, revocations):
+    revoke_token(issue_token(USER))
+    revoke_user("sari")
+    clock.now += session_tokens.SESSION_TTL + 1
+    revocations.revoke_token("lain", clock.now + 60)
+    assert list(revocations._tokens) == ["lain"]
+    assert revocations._users == {}
+
+
+def test_revocations_are_shared_through_the_store(clock, monkeypatch):
+    """Dua proses (dua RevocationList) dengan penyimpanan yang sama melihat pencabutan satu sama lain."""
+    rows = []
+
+    def save(jti, username, revoked_at, expires):
+        rows.append((jti, username, revoked_at, expires))
+
+    def load(now):
+        return [row for row in rows if row[3] > now]
+
+    first = RevocationList(save=save, load=load, refresh_interval=5)
+    second = RevocationList(save=save, load=load, refresh_interval=5)
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: first)
+    token = issue_token(USER)
+    assert verify_token(token) == USER
+
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: second)
+    assert verify_token(token) == USER
+    revoke_token(token)
+
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: first)
+    # Proses pertama baru membaca ulang setelah refresh_interval
+    assert verify_token(token) == USER
+    clock.now += 5
+    assert verify_token(token) is None
+
+    # Proses baru (mis. setelah restart) langsung memuat pencabutan yang tersimpan
+    restarted = RevocationList(save=save, load=load)
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: restarted)
+    assert verify_token(token) is None
+
+
+def test_failed_reload_keeps_last_revocations_and_retries(clock, monkeypatch):
+    rows = []
+    calls = []
+
+    def load(now):
+        calls.append(now)
+        if len(calls) == 2:
+            raise ConnectionError("database tidak dapat dihubungi")
+        return list(rows)
+
+    revocation_list = RevocationList(save=lambda *row: rows.append(row), load=load, refresh_interval=5)
+    monkeypatch.setattr(session_tokens, "get_revocation_list", lambda: revocation_list)
+    token = issue_token(USER)
+    revoke_token(token)
+
+    clock.now += 5
+    assert verify_token(token) is None  # pembacaan gagal: daftar terakhir tetap dipakai
+    assert len(calls) == 2
+    clock.now += 1
+    verify_token(token)
+    assert len(calls) == 2  # dicoba lagi setelah refresh_interval, bukan setiap permintaan
+    clock.now += 4
+    assert verify_token(token) is None
+    assert len(calls) == 3
@@ -1,15 +1,62 @@
 """
 Komponen UI yang dapat digunakan kembali untuk aplikasi Streamlit, seperti tampilan keranjang dan pesanan.
 """
+import time
 import streamlit as st
 import database as models
 from datetime import datetime
+from config import FAVORITE_FLUSH_MAX, FAVORITE_FLUSH_INTERVAL
+from images import VARIANT_WIDTHS
+from order_queue import OrderPending, place_order
 
 # --- Pembantu Navigasi ---
 def go(page_name: str):
     """Mengatur status sesi untuk menavigasi ke halaman baru."""
+    flush_favorite_changes(force=True)
     st.session_state['page'] = page_name
 
+# --- Gambar Menu ---
+
+def menu_image_url(item: dict, varian: str = 'card', fmt: str = 'jpg') -> str:
+    """URL turunan gambar menu (lihat images.py), atau gambar asli jika turunannya belum dibuat."""
+    variants = item.get('gambar_varian') or {}
+    return variants.get(varian, {}).get(fmt) or item.get('url_gambar')
+
+# Latar kartu untuk gambar yang belum punya warna dominan (mis. belum dibuat turunannya)
+PLACEHOLDER_COLOR = "#EADBC8"
+
+def _srcset(variants: dict, fmt: str) -> str:
+    candidates = {}
+    for varian in VARIANT_WIDTHS:
+        entry = variants.get(varian) or {}
+        # Gambar kecil tidak diperbesar sehingga beberapa varian bisa memiliki lebar yang sama
+        if entry.get(fmt) and entry['lebar'] not in candidates:
+            candidates[entry['lebar']] = entry[fmt]
+    return ", ".join(f"{url} {width}w" for width, url in candidates.items())
+
+def menu_picture_html(item: dict, varian: str, style: str, sizes: str) -> str:
+    """Gambar menu yang dimuat malas (lazy) dan responsif.
+
+    Browser memilih ukuran dari srcset sesuai `sizes` (WebP bila didukung, JPEG sebagai cadangan),
+    width/height mencegah tata letak bergeser, dan warna dominan tampil sebagai latar selama gambar dimuat.
+    """
+    variants = item.get('gambar_varian') or {}
+    color = variants.get('warna', PLACEHOLDER_COLOR)
+    attrs = f"loading='lazy' decoding='async' style='{style} background-color: {color};'"
+    base = variants.get(varian)
+    if not base:
+        # Varian ini belum dibuat: pakai gambar asli, dengan rasio dari turunan lain yang tersimpan (jika ada)
+        stored = [v for v in variants.values() if isinstance(v, dict) and v.get('lebar')]
+        if stored:
+            largest = max(stored, key=lambda v: v['lebar'])
+            attrs = f"width='{largest['lebar']}' height='{largest['tinggi']}' {attrs}"
+        return f"<img src='{item['url_gambar']}' alt='' {attrs} />"
+    return (
+        f"<picture><source type='image/webp' srcset='{_srcset(variants, 'webp')}' sizes='{sizes}' />"
+        f"<img src='{base['jpg']}' srcset='{_srcset(variants, 'jpg')}' sizes='{sizes}' "
+        f"width='{base['lebar']}' height='{base['tinggi']}' alt='' {attrs} /></picture>"
+    )
+
 # --- Manajemen Keranjang ---
 
 def add_to_cart(menu_id: int, quantity: int = 1):
@@ -22,13 +69,59 @@ def add_to_cart(menu_id: int, quantity: int = 1):
     st.toast("✅ Ditambahkan ke keranjang!") 
 
 def remove_from_cart(menu_id: int):
-    """Menghapus item dari keranjang sesi."""
+    """Callback tombol hapus: menghapus item dari keranjang sesi sebelum keranjang dirender ulang."""
     cart = st.session_state.get('cart', {})
     menu_id_str = str(menu_id)
     if menu_id_str in cart:
         del cart[menu_id_str]
     st.session_state['cart'] = cart
-    st.experimental_rerun()
+
+# --- Manajemen Favorit ---
+# Himpunan favorit pengguna disimpan di sesi dan diubah langsung saat tombol diklik (optimistis).
+# Perubahan dikumpulkan di 'favorite_pending' dan ditulis ke database sekaligus oleh flush_favorite_changes()
+# setelah FAVORITE_FLUSH_MAX perubahan atau FAVORITE_FLUSH_INTERVAL detik, atau saat berpindah halaman/logout.
+
+def get_favorite_ids() -> set:
+    """Mengembalikan himpunan id menu favorit pengguna; dimuat dari database sekali per sesi."""
+    if 'favorite_ids' not in st.session_state:
+        user = st.session_state.get('user')
+        st.session_state['favorite_ids'] = models.get_user_favorite_ids(user['id']) if user else set()
+        st.session_state['favorite_pending'] = {}
+    return st.session_state['favorite_ids']
+
+def toggle_favorite(menu_id: int):
+    """Callback tombol favorit: mengubah status di sesi dan mencatatnya untuk ditulis nanti."""
+    favorite_ids = get_favorite_ids()
+    if menu_id in favorite_ids:
+        favorite_ids.discard(menu_id)
+        st.toast("💔 Dihapus dari favorit.")
+    else:
+        favorite_ids.add(menu_id)
+        st.toast("❤️ Ditambahkan ke favorit!")
+    pending = st.session_state['favorite_pending']
+    if not pending:
+        st.session_state['favorite_pending_since'] = time.monotonic()
+    pending[menu_id] = menu_id in favorite_ids
+
+def flush_favorite_changes(force: bool = False):
+    """Menulis perubahan favorit yang tertunda ke database dalam satu pernyataan.
+
+    Tanpa `force`, penulisan ditunda sampai batas jumlah atau waktu tercapai, sehingga beberapa klik
+    favorit ditulis bersama. `force=True` dipakai saat berpindah halaman/tab dan logout."""
+    pending = st.session_state.get('favorite_pending')
+    user = st.session_state.get('user')
+    if not pending or not user:
+        return
+    age = time.monotonic() - st.session_state.get('favorite_pending_since', 0)
+    if not force and len(pending) < FAVORITE_FLUSH_MAX and age < FAVORITE_FLUSH_INTERVAL:
+        return
+    st.session_state['favorite_pending'] = {}
+    try:
+        models.apply_favorite_changes(user['id'], pending)
+    except Exception as e:
+        # Muat ulang dari database agar tampilan kembali sesuai data yang tersimpan
+        st.session_state.pop('favorite_ids', None)
+        st.error(f"Gagal menyimpan perubahan favorit: {e}")
 
 def show_cart():
     """Merender UI keranjang belanja."""
@@ -50,33 +143,47 @@ def show_cart():
     st.markdown("---")
     st.subheader("Daftar Item")
 
+    # Ambil detail semua item keranjang sekaligus dalam satu kueri
+    menu_items = models.get_menu_items(int(i) for i in cart)
+
     # Menggunakan kolom untuk tampilan daftar item yang lebih ringkas
     for item_id_str, quantity in cart.items():
-        item = models.get_menu_item(int(item_id_str)) # Ambil detail item
-        if item:
+        item = menu_items.get(int(item_id_str))
+        if item is None:
+            st.warning("Salah satu item di keranjang sudah tidak ada di menu dan tidak ikut dihitung.")
+            st.button("Hapus item yang tidak tersedia", key=f"rm_missing_{item_id_str}",
+                      on_click=remove_from_cart, args=(int(item_id_str),))
+            continue
+
+        col_item, col_price, col_action = st.columns([4, 2, 1])
+
+        if not item['tersedia']:
+            # Item habis ditampilkan tetapi tidak ikut dihitung dan tidak dipesan
+            with col_item:
+                st.markdown(f"~~{item['nama']}~~")
+                st.caption("🚫 Habis - item ini tidak ikut dipesan.")
+        else:
             item_total = item['harga'] * quantity
             total += item_total
-            
-            col_item, col_price, col_action = st.columns([4, 2, 1])
-            
+
             with col_item:
                 st.markdown(f"**{item['nama']}**")
                 st.caption(f"Jumlah: {quantity} x Rp {int(item['harga']):,}")
-                
+
             with col_price:
                 st.markdown(f"<p style='text-align: right; font-weight: bold;'>Rp {int(item_total):,}</p>", unsafe_allow_html=True)
 
-            with col_action:
-                if st.button("🗑️", key=f"rm_{item_id_str}", help="Hapus item ini", use_container_width=True):
-                    remove_from_cart(int(item_id_str))
-            
             items_payload.append({
                 'id_menu': item['id'],
                 'nama': item['nama'],
                 'harga': item['harga'],
                 'qty': quantity
             })
-            st.markdown("---")
+
+        with col_action:
+            st.button("🗑️", key=f"rm_{item_id_str}", help="Hapus item ini", use_container_width=True,
+                      on_click=remove_from_cart, args=(int(item_id_str),))
+        st.markdown("---")
 
     st.markdown(f"**Subtotal:** <p style='text-align: right; font-weight: bold; font-size: 1.1em;'>Rp {int(total):,}</p>", unsafe_allow_html=True)
 
@@ -114,6 +221,8 @@ def show_cart():
 
     # Bagian Checkout
     st.subheader("💳 Informasi Pesanan")
+    if not _show_pending_order():
+        return
     with st.form("checkout_form", clear_on_submit=True):
         st.text_input("Nama Anda", help="Nama untuk dipanggil saat pesanan siap", placeholder="Contoh: Risa")
         st.text_input("Nomor Meja", help="Nomor meja Anda saat ini", placeholder="Contoh: 05")
@@ -125,19 +234,48 @@ def show_cart():
             if not user:
                 st.error("Anda harus masuk untuk membuat pesanan.")
                 return
+            if not items_payload:
+                st.error("Tidak ada item tersedia di keranjang untuk dipesan.")
+                return
 
             try:
-                order_id = models.create_order(user['id'], items_payload, grand_total, payment_method)
-                st.balloons() # Efek visual sukses
-                st.success(f"Pesanan berhasil dibuat! ID Pesanan: **{order_id}**. Silakan lanjutkan ke kasir untuk pembayaran.")
-                # Kosongkan keranjang dan promo setelah pesanan berhasil
-                st.session_state['cart'] = {}
-                st.session_state['promo_applied'] = None
+                order_id = place_order(user['id'], items_payload, grand_total, payment_method)
+                _order_placed(order_id)
                 # st.experimental_rerun() # Tidak perlu rerun karena form clear_on_submit=True
+            except OrderPending as e:
+                # Pesanan mungkin sudah tersimpan: tunggu hasilnya, jangan kirim ulang
+                st.session_state['pending_order'] = e.future
+                st.info("⏳ Pesanan sedang diproses. Jangan kirim ulang; status akan muncul di sini.")
             except Exception as e:
                 st.error(f"Gagal membuat pesanan: {e}")
 
 
+def _order_placed(order_id: int):
+    st.balloons() # Efek visual sukses
+    st.success(f"Pesanan berhasil dibuat! ID Pesanan: **{order_id}**. Silakan lanjutkan ke kasir untuk pembayaran.")
+    # Kosongkan keranjang dan promo setelah pesanan berhasil
+    st.session_state['cart'] = {}
+    st.session_state['promo_applied'] = None
+
+
+def _show_pending_order() -> bool:
+    """Menampilkan hasil pesanan yang sebelumnya melewati batas waktu checkout.
+    False selama pesanan itu masih ditulis, agar formulir checkout tidak mengirim pesanan ganda."""
+    future = st.session_state.get('pending_order')
+    if future is None:
+        return True
+    if not future.done():
+        st.info("⏳ Pesanan sebelumnya sedang diproses. Jangan kirim ulang pesanan.")
+        st.button("🔄 Periksa status pesanan")
+        return False
+    del st.session_state['pending_order']
+    try:
+        _order_placed(future.result())
+    except Exception as e:
+        st.error(f"Gagal membuat pesanan: {e}")
+    return True
+
+
 def show_user_orders():
     """Merender riwayat pesanan untuk pengguna saat ini."""
     st.markdown("## 📋 Riwayat Pesanan Anda")
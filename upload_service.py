@@ -0,0 +1,72 @@
+"""
+Layanan unggah gambar di latar untuk aplikasi Caffe Dehh
+Formulir admin langsung menyimpan menu dengan status gambar 'mengunggah'; gambar diolah dan diunggah
+oleh thread pool, lalu baris menu diisi setelah unggahan selesai.
+"""
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import streamlit as st
+
+import database
+from config import UPLOAD_WORKERS, UPLOAD_RETRIES, UPLOAD_RETRY_BACKOFF
+from storage import content_digest, upload_menu_image
+
+logger = logging.getLogger(__name__)
+
+
+class UploadService:
+    """Thread pool untuk mengunggah gambar menu, dengan percobaan ulang dan backoff eksponensial."""
+
+    def __init__(self, max_workers: int, retries: int, backoff: float):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="unggah-gambar")
+        self.retries = retries
+        self.backoff = backoff
+
+    def _run(self, menu_id: int, digest: str, file_bytes: bytes, filename: str) -> bool:
+        for attempt in range(self.retries + 1):
+            try:
+                image_url, image_variants = upload_menu_image(file_bytes, filename)
+                return database.complete_menu_image(menu_id, digest, image_url, image_variants)
+            except ValueError:
+                # Berkas bukan gambar; mencoba ulang tidak akan membantu
+                logger.exception("Gambar menu #%s tidak valid", menu_id)
+                break
+            except Exception:
+                logger.exception("Unggahan gambar menu #%s gagal (percobaan %s)", menu_id, attempt + 1)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        database.fail_menu_image(menu_id, digest)
+        return False
+
+    def submit(self, menu_id: int, digest: str, file_bytes: bytes, filename: str) -> Future:
+        """Menjadwalkan unggahan. Hasil Future: True jika baris menu diisi dengan gambar baru."""
+        return self._executor.submit(self._run, menu_id, digest, file_bytes, filename)
+
+
+@st.cache_resource(show_spinner=False)
+def get_upload_service() -> UploadService:
+    """Jumlah worker dan percobaan ulang diatur lewat UPLOAD_WORKERS dan UPLOAD_RETRIES."""
+    return UploadService(UPLOAD_WORKERS, UPLOAD_RETRIES, UPLOAD_RETRY_BACKOFF)
+
+
+def create_menu_with_image(name, category, description, price, file_bytes: bytes = None, filename: str = None) -> int:
+    """Membuat menu sekarang juga; gambar (jika ada) diunggah di latar."""
+    if file_bytes is None:
+        return database.create_menu_item(name, category, description, price)
+    digest = content_digest(file_bytes)
+    menu_id = database.create_menu_item(name, category, description, price, image_pending=digest)
+    get_upload_service().submit(menu_id, digest, file_bytes, filename)
+    return menu_id
+
+
+def update_menu_with_image(menu_id, name, category, description, price, file_bytes: bytes = None, filename: str = None):
+    """Menyimpan perubahan menu sekarang juga; gambar lama tetap tampil sampai gambar baru selesai diunggah."""
+    if file_bytes is None:
+        database.update_menu_item(menu_id, name, category, description, price)
+        return
+    digest = content_digest(file_bytes)
+    database.update_menu_item(menu_id, name, category, description, price, image_pending=digest)
+    get_upload_service().submit(menu_id, digest, file_bytes, filename)
@@ -5,21 +5,38 @@ Berisi tampilan menu, keranjang, riwayat pesanan, dan fitur favorit.
 
 import streamlit as st
 from database import (
-    get_all_menu, 
-    add_to_favorites, 
-    remove_from_favorites, 
+    query_menu,
+    get_typeahead_index,
+    search_menu,
     get_favorite_menus,
     get_order_by_id,
     submit_review,
     get_reviews_for_menu
 )
-from ui import show_cart, show_user_orders, go
+from ui import (
+    show_cart, show_user_orders, go, get_favorite_ids, toggle_favorite, flush_favorite_changes,
+)
+from cards import card_html
+from session_tokens import end_session
+from config import MENU_PAGE_SIZE
 from datetime import datetime
 
+ALL_CATEGORIES = "Semua"
+
+# Pilihan urutan di page_menu (kunci sesuai database.MENU_SORTS)
+SORT_OPTIONS = {
+    'relevan': "Paling Relevan",
+    'nama': "Nama (A-Z)",
+    'harga_asc': "Harga Terendah",
+    'harga_desc': "Harga Tertinggi",
+    'rating': "Rating Tertinggi",
+    'popularitas': "Terlaris",
+}
+
 # --- FUNGSI HALAMAN UTAMA ---
 
 def show_user_dashboard():
-    """Menampilkan halaman utama pengguna dengan navigasi berbasis header dan tabs."""
+    """Menampilkan halaman utama pengguna: header, navigasi tab, dan isi tab aktif sebagai fragmen."""
     user = st.session_state.get('user', {})
     
     # Header dengan sambutan di kiri dan tombol keluar di kanan
@@ -28,46 +45,73 @@ def show_user_dashboard():
         st.markdown(f"### Selamat Datang, {user.get('nama_pengguna', 'Pelanggan')}!")
     with col2:
         if st.button("Keluar", key='user_logout', use_container_width=True):
-            st.session_state.clear()
-            st.session_state['page'] = 'login'
+            flush_favorite_changes(force=True)
+            end_session()
             st.rerun()
 
     st.markdown("---")
 
-    # Navigasi utama menggunakan komponen st.tabs
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Menu", "Keranjang", "Pesanan Saya", "Favorit", "Profil"])
-
-    with tab1:
-        page_menu()
-    with tab2:
-        show_cart()
-    with tab3:
-        show_user_orders()
-    with tab4:
-        page_favorites()
-    with tab5:
-        page_user_profile()
+    # Navigasi utama: hanya tab aktif yang dijalankan (st.tabs selalu merender semua isi tab).
+    # Setiap tab adalah fragmen, sehingga interaksi di dalamnya hanya menjalankan ulang tab itu sendiri.
+    active_tab = st.radio("Navigasi", list(USER_TABS), key='user_tab', horizontal=True, label_visibility="collapsed")
+    # Rerun penuh (bukan rerun fragmen) berarti berpindah tab atau aksi tingkat halaman: tulis favorit tertunda
+    flush_favorite_changes(force=True)
+    USER_TABS[active_tab]()
         
 # --- FUNGSI DETAIL HALAMAN (Diekspor ke main.py jika diperlukan) ---
 
 def page_menu():
     st.markdown("## 📃 Daftar Menu Caffe Dehh")
     
-    # Filter dan Pencarian
-    col_search, col_filter = st.columns([3, 1])
+    # Filter, Urutan dan Pencarian
+    col_search, col_filter, col_sort = st.columns([3, 1, 1])
     with col_search:
-        search_term = st.text_input("Cari Menu", placeholder="Ketik nama makanan atau minuman...")
-    with col_filter:
-        category_filter = st.selectbox("Filter Kategori", ["Semua", "Makanan", "Minuman", "Dessert"], label_visibility="visible")
+        # live: nilai dikirim saat mengetik (jeda 200 ms), bukan hanya saat Enter; hanya fragmen tab ini yang rerun
+        search_term = st.text_input("Cari Menu", placeholder="Ketik nama makanan atau minuman...", live="200ms")
 
-    user_id = st.session_state['user']['id']
-    all_items = get_all_menu(search=search_term, user_id=user_id)
+    favorite_ids = get_favorite_ids()
+    matched_ids = None
+    if search_term.strip():
+        # Saran dari indeks dalam memori; hasil diurutkan teks penuh (lihat search_menu)
+        matched_ids = search_menu(search_term)
+        suggestions = get_typeahead_index().suggest(search_term)
+        if suggestions:
+            col_search.caption("Saran: " + " · ".join(suggestions))
+
+    # Kategori dan urutan dibaca dari state widget agar filter, urutan dan jumlah per kategori
+    # didapat dalam satu panggilan sebelum widget-nya digambar
+    category = st.session_state.get('menu_category', ALL_CATEGORIES)
+    sort = st.session_state.get('menu_sort', 'relevan')
 
-    # Filter berdasarkan kategori
-    if category_filter != "Semua":
-        items = [item for item in all_items if item['kategori'] == category_filter]
-    else:
-        items = all_items
+    # Jumlah kartu yang tampil bertahan di antara rerun (keranjang, favorit) dan
+    # diatur ulang hanya ketika pencarian, kategori atau urutan berubah
+    filter_key = (search_term.strip(), category, sort)
+    if st.session_state.get('menu_filter_key') != filter_key:
+        st.session_state['menu_filter_key'] = filter_key
+        st.session_state['menu_visible'] = MENU_PAGE_SIZE
+    visible = st.session_state['menu_visible']
+
+    result = query_menu(
+        category=None if category == ALL_CATEGORIES else category,
+        sort=sort,
+        menu_ids=matched_ids,
+        limit=visible,
+    )
+    facets = result['facets']
+    categories = [ALL_CATEGORIES] + list(facets)
+    if category not in categories:
+        # Kategori terpilih tidak ada di hasil saat ini; tetap tampilkan agar pilihan tidak hilang
+        categories.append(category)
+
+    with col_filter:
+        st.selectbox(
+            "Filter Kategori", categories, key='menu_category',
+            format_func=lambda c: f"{c} ({sum(facets.values()) if c == ALL_CATEGORIES else facets.get(c, 0)})",
+        )
+    with col_sort:
+        st.selectbox("Urutkan", list(SORT_OPTIONS), key='menu_sort', format_func=SORT_OPTIONS.get)
+
+    items = result['items']
 
     if not items:
         st.info("Menu tidak ditemukan.")
@@ -81,198 +125,18 @@ def page_menu():
     
     for i, item in enumerate(items):
         with cols[i % 3]:
-            # Header banner dengan nama menu
-            st.markdown(f"""
-                <div style='
-                    background: linear-gradient(135deg, #D3A58E 0%, #A0522D 100%);
-                    color: white;
-                    padding: 15px;
-                    border-radius: 10px;
-                    text-align: center;
-                    font-weight: bold;
-                    font-size: 1.3em;
-                    margin-bottom: 15px;
-                '>
-                    {item['nama']}
-                </div>
-            """, unsafe_allow_html=True)
-            
-            # Gambar menu
-            if item['url_gambar']:
-                st.markdown(f"""
-                    <div style='
-                        width: 100%;
-                        height: 200px;
-                        overflow: hidden;
-                        border-radius: 10px;
-                        margin-bottom: 15px;
-                        border: 2px solid #D3A58E;
-                    '>
-                        <img src='{item['url_gambar']}' style='
-                            width: 100%;
-                            height: 100%;
-                            object-fit: cover;
-                        ' />
-                    </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                    <div style='
-                        width: 100%;
-                        height: 200px;
-                        background: linear-gradient(45deg, #D3A58E 0%, #A0522D 100%);
-                        display: flex;
-                        align-items: center;
-                        justify-content: center;
-                        border-radius: 10px;
-                        color: white;
-                        font-weight: bold;
-                        margin-bottom: 15px;
-                        border: 2px solid #8B4513;
-                    '>[Gambar Menu]</div>
-                """, unsafe_allow_html=True)
-            
-            # Kategori dengan badge style
-            st.markdown(f"""
-                <div style='
-                    display: inline-block;
-                    background-color: #E6E6FA;
-                    color: #4B0082;
-                    padding: 5px 12px;
-                    border-radius: 20px;
-                    font-size: 0.9em;
-                    font-weight: bold;
-                    margin-bottom: 10px;
-                '>
-                    {item['kategori']}
-                </div>
-            """, unsafe_allow_html=True)
-            
-            # Harga dengan styling yang menonjol
-            st.markdown(f"""
-                <div style='
-                    background: linear-gradient(90deg, #FFE4B5 0%, #FFD700 100%);
-                    padding: 12px;
-                    border-radius: 8px;
-                    text-align: center;
-                    margin: 15px 0;
-                    border: 2px solid #DAA520;
-                '>
-                    <span style='
-                        color: #8B4513;
-                        font-weight: bold;
-                        font-size: 1.4em;
-                    '>Rp {int(item['harga']):,}</span>
-                </div>
-            """, unsafe_allow_html=True)
-            
-            # Deskripsi
-            if item.get('deskripsi'):
-                desc_key = f"desc_expanded_{item['id']}_{i}"
-                is_expanded = st.session_state.get(desc_key, False)
-                
-                if len(item['deskripsi']) > 100:
-                    if is_expanded:
-                        st.markdown(f"""
-                            <div style='
-                                background-color: #F8F9FA;
-                                padding: 10px;
-                                border-radius: 8px;
-                                border-left: 3px solid #D3A58E;
-                                margin-bottom: 10px;
-                            '>
-                                <div style='color: #555; font-size: 0.9em; line-height: 1.4;'>
-                                    <strong>Deskripsi:</strong> {item['deskripsi']}
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        if st.button("Tampilkan lebih sedikit", key=f"less_{item['id']}_{i}"):
-                            st.session_state[desc_key] = False
-                            st.rerun()
-                    else:
-                        st.markdown(f"""
-                            <div style='
-                                background-color: #F8F9FA;
-                                padding: 10px;
-                                border-radius: 8px;
-                                border-left: 3px solid #D3A58E;
-                                margin-bottom: 10px;
-                            '>
-                                <div style='color: #555; font-size: 0.9em; line-height: 1.4;'>
-                                    <strong>Deskripsi:</strong> {item['deskripsi'][:100]}...
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        if st.button("Selengkapnya", key=f"more_{item['id']}_{i}"):
-                            st.session_state[desc_key] = True
-                            st.rerun()
-                else:
-                    st.markdown(f"""
-                        <div style='
-                            background-color: #F8F9FA;
-                            padding: 10px;
-                            border-radius: 8px;
-                            border-left: 3px solid #D3A58E;
-                            margin-bottom: 10px;
-                        '>
-                            <div style='color: #555; font-size: 0.9em; line-height: 1.4;'>
-                                <strong>Deskripsi:</strong> {item['deskripsi']}
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                    <div style='
-                        background-color: #F8F9FA;
-                        padding: 10px;
-                        border-radius: 8px;
-                        border-left: 3px solid #D3A58E;
-                        margin-bottom: 10px;
-                    '>
-                        <div style='color: #555; font-size: 0.9em;'>
-                            <strong>Deskripsi:</strong> -
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            # Status dan rating
-            status_icon = "✅" if item.get('tersedia', True) else "🚫"
-            status_text = "Tersedia" if item.get('tersedia', True) else "Habis"
-            status_color = "#4CAF50" if item.get('tersedia', True) else "#F44336"
-            
-            st.markdown(f"""
-                <div style='
-                    background-color: #F5F5F5;
-                    padding: 10px;
-                    border-radius: 8px;
-                    margin-bottom: 15px;
-                    border-left: 4px solid {status_color};
-                '>
-                    <div style='color: {status_color}; font-weight: bold; margin-bottom: 5px;'>
-                        {status_icon} {status_text}
-                    </div>
-                    <div style='color: #666; font-size: 0.9em;'>
-                        ⭐ {item['rating_rata_rata']:.1f} ({item['jumlah_ulasan']} ulasan)
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+            # Kartu menu: satu blok HTML (nama, gambar, kategori, harga, deskripsi, status)
+            st.markdown(card_html(item), unsafe_allow_html=True)
             
             # Area tombol
             col_fav, col_qty, col_add = st.columns([1, 2, 2])
             
             with col_fav:
-                is_favorite = item.get('is_favorite', False)
+                is_favorite = item['id'] in favorite_ids
                 fav_icon = "❤️" if is_favorite else "🤍"
                 fav_key = f"fav_{item['id']}_{i}"
-                
-                if st.button(fav_icon, key=fav_key, use_container_width=True, help="Tambahkan/Hapus dari Favorit"):
-                    if is_favorite:
-                        remove_from_favorites(user_id, item['id'])
-                        st.toast("💔 Dihapus dari favorit.")
-                    else:
-                        add_to_favorites(user_id, item['id'])
-                        st.toast("❤️ Ditambahkan ke favorit!")
-                    st.rerun()
+                st.button(fav_icon, key=fav_key, use_container_width=True, help="Tambahkan/Hapus dari Favorit",
+                          on_click=toggle_favorite, args=(item['id'],))
             
             with col_qty:
                 qty = st.number_input("Qty", min_value=1, value=1, key=f"qty_{item['id']}_{i}", label_visibility="collapsed")
@@ -283,13 +147,28 @@ def page_menu():
                     add_to_cart(item['id'], qty)
             
             st.markdown("---")
+
+    # Muat lebih banyak
+    st.markdown(
+        f"<p style='text-align: center; color: #666;'>Menampilkan {len(items)} dari {result['total']} menu</p>",
+        unsafe_allow_html=True,
+    )
+    if len(items) < result['total']:
+        _, col_more, _ = st.columns([1, 2, 1])
+        with col_more:
+            st.button("Muat lebih banyak", key='menu_load_more', use_container_width=True,
+                      on_click=load_more_menu)
+
+def load_more_menu():
+    """Callback tombol "Muat lebih banyak": menambah satu halaman kartu menu."""
+    st.session_state['menu_visible'] += MENU_PAGE_SIZE
                 
 # --- FUNGSI HALAMAN FAVORIT ---
 
 def page_favorites():
     st.markdown("## ❤️ Menu Favorit Anda")
     user_id = st.session_state['user']['id']
-    favorite_items = get_favorite_menus(user_id)
+    favorite_items = get_favorite_menus(user_id, favorite_ids=get_favorite_ids())
 
     if not favorite_items:
         st.info("Anda belum memiliki menu favorit. Jelajahi menu untuk menambahkannya!")
@@ -302,154 +181,15 @@ def page_favorites():
     
     for i, item in enumerate(favorite_items):
         with cols[i % 2]:
-            # Layout horizontal sederhana
-            col_img, col_detail, col_action = st.columns([1, 3, 1])
-            
-            with col_img:
-                if item['url_gambar']:
-                    st.markdown(f"""
-                        <div style='
-                            width: 80px;
-                            height: 80px;
-                            border-radius: 10px;
-                            overflow: hidden;
-                            border: 2px solid #D3A58E;
-                        '>
-                            <img src='{item['url_gambar']}' style='
-                                width: 100%;
-                                height: 100%;
-                                object-fit: cover;
-                            ' />
-                        </div>
-                    """, unsafe_allow_html=True)
+            col_detail, col_action = st.columns([4, 1])
             
             with col_detail:
-                # Nama menu
-                st.markdown(f"**{item['nama']}**")
-                
-                # Kategori dengan badge style
-                st.markdown(f"""
-                    <div style='
-                        display: inline-block;
-                        background-color: #E6E6FA;
-                        color: #4B0082;
-                        padding: 3px 8px;
-                        border-radius: 15px;
-                        font-size: 0.8em;
-                        font-weight: bold;
-                        margin-bottom: 8px;
-                    '>
-                        {item['kategori']}
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                # Harga dengan styling yang menonjol
-                st.markdown(f"""
-                    <div style='
-                        background: linear-gradient(90deg, #FFE4B5 0%, #FFD700 100%);
-                        padding: 8px;
-                        border-radius: 6px;
-                        text-align: center;
-                        margin: 10px 0;
-                        border: 2px solid #DAA520;
-                    '>
-                        <span style='
-                            color: #8B4513;
-                            font-weight: bold;
-                            font-size: 1.2em;
-                        '>Rp {int(item['harga']):,}</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                # Deskripsi
-                if item.get('deskripsi'):
-                    desc_key = f"fav_desc_expanded_{item['id']}_{i}"
-                    is_expanded = st.session_state.get(desc_key, False)
-                    
-                    if len(item['deskripsi']) > 60:
-                        if is_expanded:
-                            st.markdown(f"""
-                                <div style='
-                                    background-color: #F8F9FA;
-                                    padding: 8px;
-                                    border-radius: 6px;
-                                    border-left: 3px solid #D3A58E;
-                                    margin-bottom: 8px;
-                                '>
-                                    <div style='color: #555; font-size: 0.8em; line-height: 1.3;'>
-                                        <strong>Deskripsi:</strong> {item['deskripsi']}
-                                    </div>
-                                </div>
-                            """, unsafe_allow_html=True)
-                            if st.button("Tampilkan lebih sedikit", key=f"fav_less_{item['id']}_{i}"):
-                                st.session_state[desc_key] = False
-                                st.rerun()
-                        else:
-                            st.markdown(f"""
-                                <div style='
-                                    background-color: #F8F9FA;
-                                    padding: 8px;
-                                    border-radius: 6px;
-                                    border-left: 3px solid #D3A58E;
-                                    margin-bottom: 8px;
-                                '>
-                                    <div style='color: #555; font-size: 0.8em; line-height: 1.3;'>
-                                        <strong>Deskripsi:</strong> {item['deskripsi'][:60]}...
-                                    </div>
-                                </div>
-                            """, unsafe_allow_html=True)
-                            if st.button("Selengkapnya", key=f"fav_more_{item['id']}_{i}"):
-                                st.session_state[desc_key] = True
-                                st.rerun()
-                    else:
-                        st.markdown(f"""
-                            <div style='
-                                background-color: #F8F9FA;
-                                padding: 8px;
-                                border-radius: 6px;
-                                border-left: 3px solid #D3A58E;
-                                margin-bottom: 8px;
-                            '>
-                                <div style='color: #555; font-size: 0.8em; line-height: 1.3;'>
-                                    <strong>Deskripsi:</strong> {item['deskripsi']}
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.markdown("""
-                        <div style='
-                            background-color: #F8F9FA;
-                            padding: 8px;
-                            border-radius: 6px;
-                            border-left: 3px solid #D3A58E;
-                            margin-bottom: 8px;
-                        '>
-                            <div style='color: #555; font-size: 0.8em;'>
-                                <strong>Deskripsi:</strong> -
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
-                
-                # Rating
-                st.markdown(f"""
-                    <div style='
-                        background-color: #F5F5F5;
-                        padding: 8px;
-                        border-radius: 6px;
-                        border-left: 4px solid #4CAF50;
-                    '>
-                        <div style='color: #666; font-size: 0.85em;'>
-                            ⭐ {item['rating_rata_rata']:.1f} ({item['jumlah_ulasan']} ulasan)
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
+                st.markdown(card_html(item, 'favorit'), unsafe_allow_html=True)
             
             with col_action:
                 # Tombol hapus
-                if st.button("🗑️", key=f"remove_fav_{item['id']}_{i}", help="Hapus dari Favorit", use_container_width=True):
-                    remove_from_favorites(user_id, item['id'])
-                    st.toast("💔 Dihapus dari favorit.")
-                    st.rerun()
+                st.button("🗑️", key=f"remove_fav_{item['id']}_{i}", help="Hapus dari Favorit", use_container_width=True,
+                          on_click=toggle_favorite, args=(item['id'],))
             
             st.markdown("---")
 
@@ -571,9 +311,31 @@ def page_user_profile():
 
     with col_logout:
         if st.button("Keluar Akun", use_container_width=True):
-            st.session_state.clear()
-            st.session_state['page'] = 'login'
+            flush_favorite_changes(force=True)
+            end_session()
             st.rerun()
 
     st.markdown("---")
-    st.caption("Fungsi Profil memungkinkan Anda untuk mengelola detail akun Anda.")
\ No newline at end of file
+    st.caption("Fungsi Profil memungkinkan Anda untuk mengelola detail akun Anda.")
+
+
+# --- FRAGMEN TAB DASBOR ---
+
+@st.fragment
+def tab_menu():
+    page_menu()
+    # Rerun fragmen tidak menjalankan sisa skrip; periksa batas penulisan favorit di akhir fragmen
+    flush_favorite_changes()
+
+@st.fragment
+def tab_favorites():
+    page_favorites()
+    flush_favorite_changes()
+
+USER_TABS = {
+    "Menu": tab_menu,
+    "Keranjang": st.fragment(show_cart),
+    "Pesanan Saya": st.fragment(show_user_orders),
+    "Favorit": tab_favorites,
+    "Profil": st.fragment(page_user_profile),
+}